@@ -0,0 +1,44 @@
+"""api keys
+
+Revision ID: a3c1f9d27b40
+Revises: 5860d4f9027a
+Create Date: 2025-07-14 10:12:41.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c1f9d27b40'
+down_revision: Union[str, Sequence[str], None] = '5860d4f9027a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'apikey',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sqlmodel.sql.sqltypes.AutoString(length=100), nullable=False),
+        sa.Column('prefix', sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False),
+        sa.Column('key_hash', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('revoked', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_apikey_key_hash'), 'apikey', ['key_hash'], unique=True)
+    op.create_index(op.f('ix_apikey_owner_id'), 'apikey', ['owner_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_apikey_owner_id'), table_name='apikey')
+    op.drop_index(op.f('ix_apikey_key_hash'), table_name='apikey')
+    op.drop_table('apikey')
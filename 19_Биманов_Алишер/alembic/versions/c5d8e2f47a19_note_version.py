@@ -0,0 +1,28 @@
+"""note version
+
+Revision ID: c5d8e2f47a19
+Revises: a3c1f9d27b40
+Create Date: 2026-10-19 11:02:37.418260
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d8e2f47a19'
+down_revision: Union[str, Sequence[str], None] = 'a3c1f9d27b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('note', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('note', 'version')
@@ -0,0 +1,67 @@
+"""GET /notes/?limit=100: чтение через ORM против строк Core сразу в JSON.
+
+Запуск из корня проекта:
+
+    python benchmarks/list_notes.py [--requests 1000] [--rounds 3]
+
+Прежний путь (объекты Note в identity map и повторная валидация в NoteOut
+через response_model) подключается к тому же приложению отдельным маршрутом.
+Кеш ответов Redis отключен, чтобы каждый запрос доходил до БД.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from middleware_stack import setup_app, measure
+from statement_cache import NoCache
+
+import httpx
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import select
+
+from config.redis_cache import redis_cache
+from index import app
+from metadata import SessionDep
+from models import Note, NoteOut, User, get_current_user
+
+LIMIT = 100
+
+
+@app.get("/bench/orm-notes/", response_model=list[NoteOut])
+async def list_notes_orm(session: SessionDep, current_user: User = Depends(get_current_user), limit: int = 10):
+    """Прежняя реализация list_notes."""
+    result = await session.execute(select(Note).where(Note.owner_id == current_user.id).limit(limit))
+    return result.scalars().all()
+
+
+async def main(requests: int, rounds: int):
+    engine, headers = await setup_app()
+    redis_cache.redis = NoCache()
+    async with async_sessionmaker(engine)() as session:
+        session.add_all(Note(title=f"note {i}", content="content " * 10, owner_id=1) for i in range(LIMIT))
+        await session.commit()
+
+    paths = {"ORM": f"/bench/orm-notes/?limit={LIMIT}", "Core": f"/notes/?limit={LIMIT}"}
+    results = {name: 0.0 for name in paths}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        bodies = [(await client.get(path, headers=headers)).json() for path in paths.values()]
+        assert bodies[0] == bodies[1] and len(bodies[0]) == LIMIT
+        for _ in range(rounds):
+            for name, path in paths.items():
+                results[name] = max(results[name], await measure(client, path, headers, requests))
+    gain = results["Core"] / results["ORM"] - 1
+    print(f"{'endpoint':<20}{'ORM rps':>10}{'Core rps':>10}{'gain':>9}")
+    print(f"{'/notes/?limit=' + str(LIMIT):<20}{results['ORM']:>10.0f}{results['Core']:>10.0f}{gain:>+9.1%}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rounds))
@@ -0,0 +1,151 @@
+"""Микробенчмарк стека middleware: BaseHTTPMiddleware против чистого ASGI.
+
+Запуск из корня проекта:
+
+    python benchmarks/middleware_stack.py [--requests 1000] [--rounds 3]
+
+Приложение из index.py прогоняется целиком (CORS, логирование, rate limiter,
+JWT-аутентификация, кеш) через httpx.ASGITransport. PostgreSQL заменен на
+SQLite в памяти, общий клиент Redis — на fakeredis, чтобы измерять именно накладные
+расходы middleware, а не сеть.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from dataclasses import replace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("RATE_LIMIT_REQUESTS", "1000000000")
+os.environ.setdefault("RATE_LIMIT_WINDOW", "60")
+
+import httpx
+from fakeredis import FakeAsyncRedis
+from fastapi import Request
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from config.middleware import RateLimiterMiddleware, RequestLoggingMiddleware
+from config.rate_limit import RedisRateLimiter
+from config.redis_cache import redis_cache
+from config.redis_client import redis_manager
+from config.logs import setup_logging
+from config.settings import settings
+from index import app
+from metadata import get_db
+from models import Note, User, create_access_token, timedelta
+
+logger = logging.getLogger()
+
+
+class LegacyRateLimiterMiddleware(BaseHTTPMiddleware):
+    """Прежняя реализация на BaseHTTPMiddleware с тем же GCRA-лимитером."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.limiter = RedisRateLimiter(FakeAsyncRedis())
+
+    async def dispatch(self, request: Request, call_next):
+        result = await self.limiter.hit(request.client.host, settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_WINDOW)
+        response = await call_next(request)
+        response.headers.update(result.headers())
+        return response
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        logger.info({"event": "request", "method": request.method, "url": str(request.url)})
+        response = await call_next(request)
+        logger.info({"event": "response", "status_code": response.status_code})
+        return response
+
+
+LEGACY = {
+    RateLimiterMiddleware: LegacyRateLimiterMiddleware,
+    RequestLoggingMiddleware: LegacyLoggingMiddleware,
+}
+ASGI_STACK = list(app.user_middleware)
+
+
+def use_stack(legacy: bool):
+    app.user_middleware = [
+        Middleware(LEGACY.get(m.cls, m.cls) if legacy else m.cls, *m.args, **m.kwargs)
+        for m in ASGI_STACK
+    ]
+    app.middleware_stack = None
+
+
+async def setup_app():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_factory() as session:
+        user = User(username="bench", password="x" * 60)
+        session.add(user)
+        await session.commit()
+        session.add_all(Note(title=f"note {i}", content="content " * 10, owner_id=user.id) for i in range(10))
+        await session.commit()
+
+    async def get_db_override():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = get_db_override
+    # Политики эндпоинтов остаются в стеке, но с лимитом, который не сработает
+    for route in app.routes:
+        policy = getattr(getattr(route, "endpoint", None), "__rate_limit__", None)
+        if policy is not None:
+            route.endpoint.__rate_limit__ = replace(policy, limit=settings.RATE_LIMIT_REQUESTS)
+    redis_manager._client, redis_manager._loop = FakeAsyncRedis(), asyncio.get_running_loop()
+    redis_cache.redis = redis_manager.client
+    setup_logging(open(os.devnull, "w"))
+
+    token = create_access_token({"sub": "bench"}, expires_delta=timedelta(days=1))
+    return engine, {"Authorization": f"Bearer {token}"}
+
+
+async def measure(client: httpx.AsyncClient, path: str, headers: dict, requests: int) -> float:
+    for _ in range(100):
+        assert (await client.get(path, headers=headers)).status_code == 200
+    start = time.perf_counter()
+    for _ in range(requests):
+        await client.get(path, headers=headers)
+    return requests / (time.perf_counter() - start)
+
+
+async def main(requests: int, rounds: int):
+    engine, headers = await setup_app()
+    print(f"{'endpoint':<12}{'BaseHTTP rps':>14}{'ASGI rps':>12}{'gain':>9}")
+    for path in ("/health", "/notes/"):
+        results = {True: 0.0, False: 0.0}
+        # Варианты чередуются, берется лучший из раундов — так меньше шума
+        for _ in range(rounds):
+            for legacy in (True, False):
+                use_stack(legacy)
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                    results[legacy] = max(results[legacy], await measure(client, path, headers, requests))
+        gain = results[False] / results[True] - 1
+        print(f"{path:<12}{results[True]:>14.0f}{results[False]:>12.0f}{gain:>+9.1%}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rounds))
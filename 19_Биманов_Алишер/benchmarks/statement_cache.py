@@ -0,0 +1,86 @@
+"""Накладные расходы сборки и компиляции SQL на GET /notes/: select() против lambda_stmt.
+
+Запуск из корня проекта:
+
+    python benchmarks/statement_cache.py [--requests 1000] [--rounds 3]
+
+Сначала замеряется только построение выражения и ключа кеша компиляции —
+ту работу, которую lambda_stmt убирает из каждого запроса. Затем приложение
+из index.py целиком прогоняется через httpx.ASGITransport на SQLite в памяти
+с отключенным кешем ответов Redis, чтобы каждый запрос доходил до БД.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from middleware_stack import setup_app, measure
+
+import httpx
+from sqlmodel import select
+
+import notes
+from config.redis_cache import redis_cache
+from index import app
+from models import Note
+
+LAMBDA_STMT = notes.notes_list_stmt
+
+
+def select_stmt(owner_id: int, skip: int, limit: int, search: str = None):
+    """Прежняя сборка запроса: новое дерево select на каждый вызов."""
+    stmt = select(Note).where(Note.owner_id == owner_id)
+    if search:
+        search_term = f"%{search}%"
+        stmt = stmt.where((Note.title.ilike(search_term)) | (Note.content.ilike(search_term)))
+    return stmt.offset(skip).limit(limit)
+
+
+class NoCache:
+    """Кеш ответов всегда промахивается и ничего не сохраняет."""
+
+    async def mget(self, *keys):
+        return [None] * len(keys)
+
+    async def setex(self, key, ttl, value):
+        pass
+
+
+def build_cost(builder, number: int) -> float:
+    # Построение выражения и ключа кеша — то, что делает Session.execute до
+    # поиска скомпилированного SQL в кеше движка
+    return min(timeit.repeat(
+        lambda: builder(1, 0, 10, "note")._generate_cache_key(), number=number, repeat=3
+    )) / number
+
+
+async def main(requests: int, rounds: int):
+    print(f"{'statement':<12}{'build+key, us':>16}")
+    for name, builder in (("select", select_stmt), ("lambda_stmt", LAMBDA_STMT)):
+        print(f"{name:<12}{build_cost(builder, requests * 10) * 1e6:>16.1f}")
+
+    engine, headers = await setup_app()
+    redis_cache.redis = NoCache()
+    results = {"select": 0.0, "lambda_stmt": 0.0}
+    for _ in range(rounds):
+        for name, builder in (("select", select_stmt), ("lambda_stmt", LAMBDA_STMT)):
+            notes.notes_list_stmt = builder
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                results[name] = max(results[name], await measure(client, "/notes/?search=note", headers, requests))
+    notes.notes_list_stmt = LAMBDA_STMT
+    gain = results["lambda_stmt"] / results["select"] - 1
+    print(f"\n{'endpoint':<20}{'select rps':>12}{'lambda rps':>12}{'gain':>9}")
+    print(f"{'/notes/?search=note':<20}{results['select']:>12.0f}{results['lambda_stmt']:>12.0f}{gain:>+9.1%}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.rounds))
@@ -1,5 +1,8 @@
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 import os
+from config.settings import settings
+from config.tracing import setup_tracing, shutdown_tracing
 
 
 celery_app = Celery(
@@ -22,4 +25,28 @@ celery_app.conf.update(
     }
 )
 
-celery_app.conf.result_expires = 3600
\ No newline at end of file
+celery_app.conf.result_expires = 3600
+
+# Воркер — отдельный процесс и не может разделять пул API, но размер пула
+# и health check берутся из тех же настроек, что и у RedisManager
+celery_app.conf.update(
+    broker_pool_limit=settings.REDIS_POOL_SIZE,
+    redis_max_connections=settings.REDIS_POOL_SIZE,
+    redis_backend_health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    redis_socket_keepalive=True,
+    broker_transport_options={
+        "max_connections": settings.REDIS_POOL_SIZE,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+    }
+)
+
+
+# Трассировка включается в каждом процессе воркера после fork
+@worker_process_init.connect
+def init_worker_tracing(**kwargs):
+    setup_tracing()
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_tracing(**kwargs):
+    shutdown_tracing()
@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+from prometheus_client import Counter
+from redis.exceptions import RedisError
+from sqlalchemy import bindparam, column, select, table, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from config.redis_cache import redis_cache
+from config.redis_client import redis_manager
+from config.redis_guard import CircuitBreaker, redis_breaker
+from config.settings import settings
+
+logger = logging.getLogger("autosave")
+
+AUTOSAVE_WRITES = Counter(
+    "note_autosave_total",
+    "Автосохранения заметок: buffered — в буфер Redis, direct — сразу в БД, conflict — черновик отброшен при сбросе",
+    ["outcome"]
+)
+AUTOSAVE_FLUSHED = Counter(
+    "note_autosave_flushed_total",
+    "Заметки, записанные в БД из буфера автосохранения"
+)
+
+DIRTY_KEY = "autosave:dirty"
+BUFFER_FIELDS = ("title", "content")
+# Без этих полей буфер не записать в БД
+REQUIRED_FIELDS = ("owner_id", "title", "content", "version", "rev")
+
+# Изменения пишутся в буфер вместе с полной заметкой (`base`) атомарно.
+# Без base скрипт пишет только в существующий буфер, иначе возвращает nil:
+# буфер мог быть сброшен в БД между чтением и записью, а неполный хеш
+# сломал бы следующий сброс.
+# KEYS[1] - буфер, KEYS[2] - DIRTY_KEY;
+# ARGV: ttl, now, note_id, число полей base, затем пары полей base и изменений
+SAVE_SCRIPT = """
+local nbase = tonumber(ARGV[4])
+if nbase == 0 and redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local i = 5
+for _ = 1, nbase do
+    redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1])
+    i = i + 2
+end
+while i <= #ARGV do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    i = i + 2
+end
+redis.call('HINCRBY', KEYS[1], 'rev', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[2], 'NX', ARGV[2], ARGV[3])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# После сброса: буфер той же версии заметки удаляется, если его не меняли,
+# пока шла запись в БД, иначе его база сдвигается на записанную версию.
+# Пустой ARGV[3] — черновик отброшен (заметку изменили в обход буфера).
+# KEYS[1] - буфер; ARGV: version, rev, новая version или ''
+RELEASE_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'version') ~= ARGV[1] then
+    return 0
+end
+if ARGV[3] == '' or redis.call('HGET', KEYS[1], 'rev') == ARGV[2] then
+    return redis.call('DEL', KEYS[1])
+end
+redis.call('HSET', KEYS[1], 'version', ARGV[3])
+return 2
+"""
+
+# Легкое описание таблицы: модели импортируют metadata, а она — этот модуль
+note_table = table("note", column("id"), column("title"), column("content"), column("version"))
+
+# Черновик пишется только поверх той версии, с которой он начат
+FLUSH_STMT = (
+    update(note_table)
+    .where(note_table.c.id == bindparam("note_id"), note_table.c.version == bindparam("base_version"))
+    .values(
+        title=bindparam("new_title"),
+        content=bindparam("new_content"),
+        version=note_table.c.version + 1
+    )
+)
+
+
+def _key(note_id: int) -> str:
+    return f"autosave:note:{note_id}"
+
+
+def _decode(data: dict) -> dict:
+    return {
+        (key.decode() if isinstance(key, bytes) else key): (value.decode() if isinstance(value, bytes) else value)
+        for key, value in data.items()
+    }
+
+
+class AutosaveBuffer:
+    """Склеивает частые автосохранения заметки в редкие записи в БД.
+
+    Последняя версия полей заметки лежит в хеше Redis, а id заметки — в
+    sorted set с временем первого несохраненного изменения. Фоновый flusher
+    раз в `interval` секунд забирает заметки, ожидающие дольше `delay`,
+    и пишет их в БД одним executemany. Забор через ZREM атомарен, поэтому
+    flusher может работать в каждом воркере. Если во время записи заметку
+    снова изменили, буфер остается и попадает в следующий сброс.
+
+    Буфер помнит версию заметки, с которой начат. Сброс пишет черновик
+    только поверх этой версии, поэтому явный PUT, пришедший во время
+    сброса, не перезаписывается; такой черновик отбрасывается.
+    """
+
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        interval: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        breaker: CircuitBreaker = redis_breaker
+    ):
+        self.delay = settings.AUTOSAVE_FLUSH_DELAY_SECONDS if delay is None else delay
+        self.interval = interval or settings.AUTOSAVE_FLUSH_INTERVAL_SECONDS
+        self.batch_size = batch_size or settings.AUTOSAVE_BATCH_SIZE
+        self.breaker = breaker
+        self.session_factory: Optional[async_sessionmaker] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def redis(self):
+        return redis_manager.client
+
+    async def get(self, note_id: int) -> Optional[dict]:
+        data = await self.breaker.call(self.redis.hgetall, _key(note_id))
+        return _decode(data) if data else None
+
+    async def save(self, note_id: int, fields: dict, base: Optional[dict] = None) -> Optional[dict]:
+        """Кладет изменения в буфер; `base` — полная заметка из БД на случай,
+        если буфера еще нет. Возвращает буферизованную версию заметки или
+        None, если буфера нет, а base не передан."""
+        args = [settings.AUTOSAVE_BUFFER_TTL, time.time(), note_id, len(base or {})]
+        for name, value in (*(base or {}).items(), *fields.items()):
+            args += [name, value]
+        script = self.redis.register_script(SAVE_SCRIPT)
+        data = await self.breaker.call(script, keys=[_key(note_id), DIRTY_KEY], args=args)
+        if data is None:
+            return None
+        AUTOSAVE_WRITES.labels("buffered").inc()
+        return _decode(dict(zip(data[::2], data[1::2])))
+
+    async def overlay(self, notes: list[dict]) -> list[dict]:
+        """Подставляет в заметки из БД несохраненные поля из буфера."""
+        if not notes:
+            return notes
+
+        async def _fetch():
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for note in notes:
+                    pipe.hmget(_key(note["id"]), *BUFFER_FIELDS)
+                return await pipe.execute()
+
+        try:
+            buffered = await self.breaker.call(_fetch)
+        except RedisError:
+            return notes
+        for note, values in zip(notes, buffered):
+            for name, value in zip(BUFFER_FIELDS, values):
+                if value is not None:
+                    note[name] = value.decode() if isinstance(value, bytes) else value
+        return notes
+
+    async def discard(self, note_id: int):
+        """Сбрасывает буфер после обычного изменения или удаления заметки."""
+
+        async def _discard():
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(_key(note_id))
+                pipe.zrem(DIRTY_KEY, note_id)
+                await pipe.execute()
+
+        try:
+            await self.breaker.call(_discard)
+        except RedisError as e:
+            logger.warning({"event": "autosave_discard_failed", "note_id": note_id, "error": repr(e)})
+
+    async def _claim(self, cutoff: float) -> list[tuple[int, float]]:
+        candidates = await self.redis.zrangebyscore(DIRTY_KEY, 0, cutoff, start=0, num=self.batch_size, withscores=True)
+        if not candidates:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for member, _ in candidates:
+                pipe.zrem(DIRTY_KEY, member)
+            removed = await pipe.execute()
+        return [(int(member), score) for (member, score), ok in zip(candidates, removed) if ok]
+
+    async def _load(self, claimed: list[tuple[int, float]]) -> list[dict]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for note_id, _ in claimed:
+                pipe.hgetall(_key(note_id))
+            return [_decode(data) for data in await pipe.execute()]
+
+    async def _release(self, written: list[tuple[int, dict]], dropped: list[tuple[int, dict]]):
+        script = self.redis.register_script(RELEASE_SCRIPT)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for note_id, data in written:
+                await script(keys=[_key(note_id)], args=[data["version"], data["rev"], int(data["version"]) + 1], client=pipe)
+            for note_id, data in dropped:
+                await script(keys=[_key(note_id)], args=[data["version"], data["rev"], ""], client=pipe)
+            await pipe.execute()
+
+    async def _write(self, buffers: list[tuple[int, dict]]) -> list[tuple[int, dict]]:
+        """Пишет черновики, чья заметка не менялась с начала буфера; строки
+        блокируются до commit, поэтому обычный PUT не вклинится между
+        проверкой версии и записью."""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(note_table.c.id, note_table.c.version)
+                .where(note_table.c.id.in_([note_id for note_id, _ in buffers]))
+                .with_for_update()
+            )
+            versions = dict(result.all())
+            written = [(note_id, data) for note_id, data in buffers if versions.get(note_id) == int(data["version"])]
+            if written:
+                await session.execute(FLUSH_STMT, [
+                    {
+                        "note_id": note_id,
+                        "base_version": int(data["version"]),
+                        "new_title": data["title"],
+                        "new_content": data["content"]
+                    }
+                    for note_id, data in written
+                ])
+            await session.commit()
+        return written
+
+    async def flush(self, force: bool = False) -> int:
+        """Записывает в БД заметки, ожидающие дольше `delay` (все при force)."""
+        cutoff = time.time() if force else time.time() - self.delay
+        claimed = await self.breaker.call(self._claim, cutoff)
+        if not claimed:
+            return 0
+        loaded = await self.breaker.call(self._load, claimed)
+        buffers, malformed = [], []
+        for (note_id, _), data in zip(claimed, loaded):
+            if all(name in data for name in REQUIRED_FIELDS):
+                buffers.append((note_id, data))
+            elif data:
+                malformed.append(note_id)
+        if malformed:
+            # Неполный буфер не записать; он не должен блокировать остальные
+            logger.warning({"event": "autosave_buffer_malformed", "note_ids": malformed})
+            await self.breaker.call(self.redis.delete, *(_key(note_id) for note_id in malformed))
+        if buffers:
+            try:
+                written = await self._write(buffers)
+            except Exception:
+                # Заметки возвращаются в очередь с прежним временем изменения
+                await self.breaker.call(self.redis.zadd, DIRTY_KEY, {note_id: score for note_id, score in claimed})
+                raise
+            written_ids = {note_id for note_id, _ in written}
+            dropped = [(note_id, data) for note_id, data in buffers if note_id not in written_ids]
+            if dropped:
+                logger.warning({"event": "autosave_conflict", "note_ids": [note_id for note_id, _ in dropped]})
+                AUTOSAVE_WRITES.labels("conflict").inc(len(dropped))
+            # Кеш списков сбрасывается до удаления буферов: пока буфер жив,
+            # список все равно показывает черновик поверх кеша
+            for owner_id in {data["owner_id"] for _, data in written}:
+                await redis_cache.invalidate("notes", owner_id)
+            await self.breaker.call(self._release, written, dropped)
+            AUTOSAVE_FLUSHED.inc(len(written))
+            return len(written)
+        return 0
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                while await self.flush() >= self.batch_size:
+                    pass
+            except Exception as e:
+                logger.warning({"event": "autosave_flush_failed", "error": repr(e)})
+
+    async def start(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # При остановке воркера несохраненные изменения пишутся сразу
+        try:
+            while await self.flush(force=True) >= self.batch_size:
+                pass
+        except Exception as e:
+            logger.warning({"event": "autosave_flush_failed", "error": repr(e)})
+
+
+autosave_buffer = AutosaveBuffer()
@@ -0,0 +1,180 @@
+import asyncio
+import time
+from typing import Optional
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from config.settings import settings
+from config.timing import instrument_engine
+from config.sql_profiler import profile_engine
+
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Время получения соединения из пула БД, включая открытие нового",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_connections_checked_out",
+    "Соединения БД, выданные из пула",
+    ["pool"],
+    multiprocess_mode="livesum"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Соединения БД сверх pool_size (max_overflow)",
+    ["pool"],
+    multiprocess_mode="livesum"
+)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, который отдает время ожидания соединения.
+
+    Если заняты и pool_size, и max_overflow соединений, запрос ждет
+    до pool_timeout секунд, после чего получает TimeoutError.
+    """
+
+    def _update_gauges(self):
+        DB_POOL_CHECKED_OUT.labels(self.logging_name).set(self.checkedout())
+        DB_POOL_OVERFLOW.labels(self.logging_name).set(max(self.overflow(), 0))
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.labels(self.logging_name).observe(time.perf_counter() - start)
+            self._update_gauges()
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self._update_gauges()
+
+
+def create_engine(url: Optional[str] = None, name: str = "primary") -> AsyncEngine:
+    """Движок БД с настройками пула из settings.
+
+    pool_pre_ping проверяет соединение перед выдачей и заменяет оборванное,
+    pool_recycle переоткрывает соединения старше заданного числа секунд —
+    раньше, чем их закроет сервер или балансировщик. Для asyncpg задаются
+    размеры кешей подготовленных выражений драйвера и SQLAlchemy: повторные
+    запросы не готовятся заново на сервере (0 — для pgbouncer в режиме
+    transaction). `name` — метка пула в метриках. Движок сразу подключается
+    к метрикам времени и профайлеру SQL.
+    """
+    url = make_url(url or settings.DATABASE_URL)
+    connect_args = {}
+    if url.get_driver_name() == "asyncpg":
+        connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+        connect_args["prepared_statement_cache_size"] = settings.DB_PREPARED_STATEMENT_CACHE_SIZE
+        if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+            # Явный общий предел для всех запросов соединения; по умолчанию
+            # выключен, время SQL сокращает только дедлайн (config.deadline)
+            connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+
+    engine = create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_logging_name=name,
+        connect_args=connect_args
+    )
+    instrument_engine(engine.sync_engine)
+    profile_engine(engine.sync_engine)
+    return engine
+
+
+async def warm_up_pool(engine: AsyncEngine, size: Optional[int] = None):
+    """Открывает `size` соединений одновременно и возвращает их в пул,
+    чтобы первые запросы не тратили время на подключение к БД."""
+    size = min(settings.DB_POOL_WARMUP if size is None else size, engine.pool.size())
+    if size <= 0:
+        return
+    connections = await asyncio.gather(*(engine.connect().start() for _ in range(size)))
+    await asyncio.gather(*(connection.close() for connection in connections))
+
+
+# Признак записи в текущей транзакции сессии: такую транзакцию LazySession
+# не завершает сам, ее фиксирует только явный commit
+@event.listens_for(Session, "after_flush")
+def _mark_write(session, flush_context):
+    session.info["writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_write_statement(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["writes"] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _clear_write(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("writes", None)
+
+
+class LazySession:
+    """Сессия запроса, которая держит соединение из пула только на время запросов.
+
+    AsyncSession создается при первом обращении, поэтому запрос, отвеченный
+    из кеша или отклоненный до работы с БД, не трогает пул. После каждого
+    чтения, если в сессии нет несохраненных изменений, транзакция
+    завершается и соединение сразу возвращается в пул: результат к этому
+    моменту уже буферизован, а объекты не устаревают (expire_on_commit=False).
+    Транзакция с записью (flush или DML) остается открытой до явного commit.
+    Остальные методы AsyncSession проксируются как есть.
+    """
+
+    def __init__(self, factory: async_sessionmaker):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    async def _release(self):
+        session = self._session
+        if session.in_transaction() and not (
+            session.info.get("writes") or session.new or session.dirty or session.deleted
+        ):
+            await session.commit()
+
+    async def execute(self, statement, *args, **kwargs):
+        result = await self.session.execute(statement, *args, **kwargs)
+        await self._release()
+        return result
+
+    async def scalar(self, statement, *args, **kwargs):
+        result = await self.session.scalar(statement, *args, **kwargs)
+        await self._release()
+        return result
+
+    async def get(self, entity, ident, **kwargs):
+        result = await self.session.get(entity, ident, **kwargs)
+        await self._release()
+        return result
+
+    async def refresh(self, instance, *args, **kwargs):
+        await self.session.refresh(instance, *args, **kwargs)
+        await self._release()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
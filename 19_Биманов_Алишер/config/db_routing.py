@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import random
+import time
+from contextvars import ContextVar
+from typing import Optional
+from prometheus_client import Gauge
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config.settings import settings
+
+logger = logging.getLogger("sql")
+
+REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Отставание реплики БД от primary",
+    ["replica"],
+    multiprocess_mode="max"
+)
+
+PRIMARY_COOKIE = "db_primary_until"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Можно ли текущему запросу читать с реплики. По умолчанию нельзя:
+# фоновые задачи, WebSocket и запись всегда идут в primary
+_use_replica: ContextVar[bool] = ContextVar("use_replica", default=False)
+
+# Записи изменяющего запроса: список общий для всего запроса, поэтому
+# отметку видит middleware, даже если ее поставил код в другом контексте
+_request_writes: ContextVar[Optional[list]] = ContextVar("request_writes", default=None)
+
+
+def mark_write():
+    """Отмечает, что текущий запрос изменил данные в primary.
+
+    Сессии отмечают запись сами при commit; вызов нужен, только если запись
+    сделал кто-то другой по поручению запроса (например, групповая вставка).
+    """
+    writes = _request_writes.get()
+    if writes is not None and not writes:
+        writes.append(True)
+
+
+# Признак writes ставят обработчики сессии в config.database
+@event.listens_for(Session, "after_commit")
+def _mark_request_write(session):
+    if session.info.get("writes"):
+        mark_write()
+
+
+class RoutingSession(Session):
+    """Сессия, которая направляет чтение на реплику, а запись в primary.
+
+    Чтение в запросе с `_use_replica` идет на здоровую реплику, выбранную
+    один раз на сессию: все запросы сессии видят один снимок данных, а не
+    реплики с разным отставанием. Запись (flush и DML) и все остальное —
+    в primary. Подкласс с конкретными движками создает routing_session_class().
+    """
+
+    primary = None
+    replicas: list = []
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase) or not _use_replica.get():
+            return self.primary
+        replica = self.info.get("replica")
+        if replica is None or not replica_monitor.is_healthy(replica):
+            healthy = [replica for replica in self.replicas if replica_monitor.is_healthy(replica)]
+            if not healthy:
+                return self.primary
+            replica = self.info["replica"] = random.choice(healthy)
+        return replica
+
+
+def routing_session_class(primary: AsyncEngine, replicas: list[AsyncEngine]) -> type[RoutingSession]:
+    return type("RoutingSession", (RoutingSession,), {
+        "primary": primary.sync_engine,
+        "replicas": [replica.sync_engine for replica in replicas],
+    })
+
+
+class ReplicaLagMonitor:
+    """Периодически замеряет отставание реплик PostgreSQL.
+
+    Отставание считается как время с последней примененной транзакции, а
+    при полностью примененном WAL — ноль. Реплика, отставшая больше
+    DB_REPLICA_MAX_LAG_SECONDS или недоступная, исключается из чтения до
+    следующей успешной проверки.
+    """
+
+    def __init__(self, interval: Optional[float] = None, max_lag: Optional[float] = None):
+        self.interval = interval or settings.DB_REPLICA_LAG_INTERVAL_SECONDS
+        self.max_lag = max_lag or settings.DB_REPLICA_MAX_LAG_SECONDS
+        self.lag: dict = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def is_healthy(self, engine) -> bool:
+        return self.lag.get(engine, 0.0) <= self.max_lag
+
+    async def check(self, replica: AsyncEngine):
+        name = replica.sync_engine.pool.logging_name
+        try:
+            async with replica.connect() as conn:
+                lag = (await conn.execute(text(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+                ))).scalar_one()
+        except Exception as exc:
+            logger.warning({"event": "replica_check_failed", "replica": name, "error": repr(exc)})
+            lag = float("inf")
+        self.lag[replica.sync_engine] = float(lag)
+        REPLICA_LAG.labels(name).set(float(lag))
+
+    async def _run(self, replicas: list[AsyncEngine]):
+        while True:
+            await asyncio.gather(*(self.check(replica) for replica in replicas))
+            await asyncio.sleep(self.interval)
+
+    async def start(self, replicas: list[AsyncEngine]):
+        if replicas and replicas[0].dialect.name == "postgresql":
+            self._task = asyncio.create_task(self._run(replicas))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+replica_monitor = ReplicaLagMonitor()
+
+
+class ReadRoutingMiddleware:
+    """Разрешает чтение с реплик для GET/HEAD/OPTIONS-запросов.
+
+    Read-your-writes: после успешного запроса, который записал данные в
+    primary (commit сессии с изменениями или `mark_write`), клиент получает
+    cookie `db_primary_until` и в течение DB_READ_YOUR_WRITES_SECONDS читает
+    из primary, поэтому видит свои изменения несмотря на отставание реплик.
+    """
+
+    def __init__(self, app: ASGIApp, pin_seconds: Optional[float] = None):
+        self.app = app
+        self.pin_seconds = settings.DB_READ_YOUR_WRITES_SECONDS if pin_seconds is None else pin_seconds
+
+    def _pinned(self, scope: Scope) -> bool:
+        try:
+            return float(HTTPConnection(scope).cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] in SAFE_METHODS:
+            token = _use_replica.set(not self._pinned(scope))
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _use_replica.reset(token)
+            return
+
+        # POST без записи (например, вход) не переводит клиента на primary
+        writes = []
+        token = _request_writes.set(writes)
+
+        async def send_with_pin(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400 and writes:
+                until = time.time() + self.pin_seconds
+                MutableHeaders(scope=message).append(
+                    "Set-Cookie",
+                    f"{PRIMARY_COOKIE}={until:.3f}; Max-Age={int(self.pin_seconds) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_pin)
+        finally:
+            _request_writes.reset(token)
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+from fastapi.responses import JSONResponse
+from prometheus_client import Counter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config.settings import settings
+from config.metrics import is_excluded, route_label
+
+logger = logging.getLogger()
+
+DEADLINE_EXCEEDED = Counter(
+    "http_request_deadline_exceeded_total",
+    "Запросы, прерванные по дедлайну (timeout) или из-за отключения клиента (disconnect)",
+    ["route", "reason"]
+)
+
+TIMEOUT_HEADER = b"x-request-timeout"
+
+# Момент (time.monotonic), после которого работа запроса больше не нужна
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """Секунды до дедлайна текущего запроса; None вне запроса."""
+    deadline = _deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def request_timeout(seconds: float):
+    """Декоратор эндпоинта: собственный дедлайн вместо REQUEST_TIMEOUT_SECONDS.
+
+    Ставится под `@router.*`. Клиент может только сократить его заголовком
+    `X-Request-Timeout`.
+    """
+    def decorator(func):
+        func.__request_timeout__ = seconds
+        return func
+    return decorator
+
+
+def resolve_timeout(scope: Scope) -> float:
+    timeout = settings.REQUEST_TIMEOUT_SECONDS
+    app = scope.get("app")
+    if app is not None:
+        for route in app.router.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                timeout = getattr(child_scope.get("endpoint"), "__request_timeout__", timeout)
+                break
+    for name, value in scope["headers"]:
+        if name == TIMEOUT_HEADER:
+            try:
+                requested = float(value)
+            except ValueError:
+                break
+            if requested > 0:
+                timeout = min(timeout, requested)
+            break
+    return timeout
+
+
+# Дедлайн доходит до Postgres как statement_timeout транзакции: сервер сам
+# прервет запрос, даже если отмена со стороны приложения не дойдет. Пока
+# бюджета много, запрос прерывает отмена задачи (asyncpg cancel), поэтому
+# лишний round trip SET LOCAL нужен, только когда бюджета осталось меньше
+# порога (или меньше предела соединения DB_STATEMENT_TIMEOUT_MS, если он задан)
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    left = remaining()
+    if left is None or connection.dialect.name != "postgresql":
+        return
+    left_ms = max(1, int(left * 1000))
+    limit = settings.DB_STATEMENT_TIMEOUT_MS or settings.DB_DEADLINE_TIMEOUT_THRESHOLD_MS
+    if left_ms < limit:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {left_ms}")
+
+
+class DeadlineMiddleware:
+    """Прерывает запрос по дедлайну или при отключении клиента.
+
+    Дедлайн — REQUEST_TIMEOUT_SECONDS, `@request_timeout` эндпоинта или
+    меньший `X-Request-Timeout` клиента. По истечении клиент получает 504,
+    а при отключении клиента запрос отменяется без ответа. Отмена задачи
+    прерывает и текущий SQL: asyncpg отправляет серверу cancel, а
+    соединение возвращается в пул, не дожидаясь результата.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timeout = resolve_timeout(scope)
+        token = _deadline.set(time.monotonic() + timeout)
+        task = asyncio.current_task()
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+        started = finished = disconnected = False
+
+        # Сообщения клиента читаются заранее, чтобы заметить disconnect,
+        # даже если эндпоинт сам не читает тело запроса
+        async def watch():
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    if not finished:
+                        disconnected = True
+                        task.cancel()
+                    return
+
+        async def receive_queued() -> Message:
+            return await messages.get()
+
+        async def send_tracked(message: Message):
+            nonlocal started, finished
+            if message["type"] == "http.response.start":
+                started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = True
+            await send(message)
+
+        watcher = asyncio.create_task(watch())
+        try:
+            async with asyncio.timeout(timeout) as deadline:
+                await self.app(scope, receive_queued, send_tracked)
+            return
+        except TimeoutError:
+            # TimeoutError самого эндпоинта — обычная ошибка, а не дедлайн
+            if not deadline.expired():
+                raise
+            reason = "timeout"
+        except asyncio.CancelledError:
+            if not disconnected:
+                raise
+            task.uncancel()
+            reason = "disconnect"
+        finally:
+            watcher.cancel()
+            _deadline.reset(token)
+
+        if not is_excluded(scope["path"]):
+            DEADLINE_EXCEEDED.labels(route_label(scope), reason).inc()
+        logger.warning({"event": "request_aborted", "reason": reason, "path": scope["path"], "timeout": timeout})
+        if reason == "timeout" and not started:
+            response = JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
+            await response(scope, receive, send)
@@ -0,0 +1,92 @@
+import asyncio
+import contextvars
+import logging
+from typing import Optional, Sequence
+from prometheus_client import Histogram
+from sqlalchemy import Table, insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from config.db_routing import mark_write
+from config.settings import settings
+
+logger = logging.getLogger("sql")
+
+GROUP_COMMIT_BATCH = Histogram(
+    "db_group_commit_batch_rows",
+    "Строк в одной групповой вставке",
+    ["table"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+
+
+class GroupCommitWriter:
+    """Групповая вставка: конкурентные INSERT одной таблицы в одной транзакции.
+
+    Запросы встают в очередь процесса; очередь сбрасывается через
+    `max_delay` секунд после первой строки или сразу при `max_rows` строках
+    одним многострочным INSERT ... RETURNING. Порядок RETURNING совпадает
+    с порядком строк (sort_by_parameter_order), поэтому каждый запрос
+    получает свою строку. Если пачка падает, строки вставляются по одной,
+    и ошибка достается только запросу с плохой строкой.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        table: Table,
+        returning: Sequence,
+        max_delay: Optional[float] = None,
+        max_rows: Optional[int] = None
+    ):
+        self.session_factory = session_factory
+        self.table = table
+        self.stmt = insert(table).returning(*returning, sort_by_parameter_order=True)
+        self.max_delay = settings.DB_GROUP_COMMIT_DELAY_MS / 1000 if max_delay is None else max_delay
+        self.max_rows = max_rows or settings.DB_GROUP_COMMIT_MAX_ROWS
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def insert(self, values: dict) -> Row:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((values, future))
+        if len(self._pending) >= self.max_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        # Отмена запроса не отменяет вставку: строка уже в пачке
+        row = await asyncio.shield(future)
+        # Пачку фиксирует отдельная задача, запрос отмечает запись сам
+        mark_write()
+        return row
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # Пустой контекст: запись не относится к запросу, запустившему сброс
+            task = asyncio.create_task(self._write(batch), context=contextvars.Context())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, batch: list[tuple[dict, asyncio.Future]]):
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(self.stmt, [values for values, _ in batch])
+                rows = result.all()
+                await session.commit()
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            logger.warning({"event": "group_commit_failed", "table": self.table.name, "rows": len(batch), "error": repr(e)})
+            for item in batch:
+                await self._write([item])
+            return
+        GROUP_COMMIT_BATCH.labels(self.table.name).observe(len(batch))
+        for (_, future), row in zip(batch, rows):
+            future.set_result(row)
+
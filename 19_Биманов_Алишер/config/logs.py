@@ -0,0 +1,77 @@
+import atexit
+import copy
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import orjson
+from config.settings import settings
+
+# Атрибуты LogRecord, которые не попадают в JSON как extra-поля
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+listener: Optional[QueueListener] = None
+
+
+class OrjsonFormatter(logging.Formatter):
+    """JSON-строка на запись. Словарь в `msg` и extra-поля попадают в корень."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if isinstance(record.msg, dict):
+            entry.update(record.msg)
+        else:
+            entry["message"] = record.getMessage()
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Стандартный QueueHandler форматирует запись в потоке вызова;
+        # здесь форматирование целиком выполняет поток QueueListener
+        if record.args:
+            record = copy.copy(record)
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def setup_logging(stream=None) -> QueueListener:
+    """Подключает корневой логгер к очереди, которую разбирает фоновый поток.
+
+    Обработчик логирования в цикле событий только кладет запись в очередь;
+    сериализация и запись в поток вывода не блокируют запросы.
+    """
+    global listener
+    stop_logging()
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(OrjsonFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers = [_DeferredQueueHandler(log_queue)]
+    root.setLevel(settings.LOG_LEVEL)
+    listener.start()
+    return listener
+
+
+@atexit.register
+def stop_logging():
+    """Дописывает очередь и останавливает фоновый поток."""
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+from prometheus_client import Counter, Histogram
+from config.settings import settings
+
+logger = logging.getLogger("loop")
+
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Задержка цикла событий: насколько позже запланированного просыпается таймер",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+LOOP_BLOCKED = Counter(
+    "event_loop_blocked_total",
+    "Случаи блокировки цикла событий дольше порога"
+)
+
+
+class LoopLagMonitor:
+    """Замеряет лаг цикла событий и ловит блокирующие вызовы.
+
+    Задача в цикле каждые `interval` секунд засыпает и замеряет, насколько
+    позже она проснулась. Отдельный поток-watchdog следит за ее пульсом:
+    если цикл не отвечает дольше `threshold`, watchdog снимает стек потока
+    цикла — в нем виден вызов, который его блокирует, — и пишет в лог.
+    """
+
+    def __init__(self, interval: Optional[float] = None, threshold: Optional[float] = None):
+        self.interval = interval or settings.LOOP_LAG_INTERVAL_MS / 1000
+        self.threshold = threshold or settings.LOOP_LAG_THRESHOLD_MS / 1000
+        self.heartbeat = time.monotonic()
+        self.loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def _measure(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.observe(max(0.0, time.perf_counter() - start - self.interval))
+            self.heartbeat = time.monotonic()
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.threshold / 2):
+            heartbeat = self.heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.threshold or heartbeat == reported:
+                continue
+            # Одна запись на каждую остановку цикла
+            reported = heartbeat
+            LOOP_BLOCKED.inc()
+            frame = sys._current_frames().get(self.loop_thread_id)
+            logger.warning({
+                "event": "loop_blocked",
+                "blocked_ms": round(blocked * 1000, 1),
+                "stack": "".join(traceback.format_stack(frame)) if frame else None
+            })
+
+    async def start(self):
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._measure())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+
+loop_monitor = LoopLagMonitor()
@@ -1,50 +1,140 @@
-from fastapi import Request, HTTPException
+import logging
+import random
+import time
+from typing import Optional
 from fastapi.responses import JSONResponse
-from redis.asyncio import Redis, from_url
+from redis.exceptions import RedisError
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from config.settings import settings
-import time
-from starlette.middleware.base import BaseHTTPMiddleware
+from config.rate_limit import RedisRateLimiter, HybridRateLimiter, resolve_policy, client_key
+from config.redis_guard import CircuitOpenError, redis_breaker
+from config.redis_client import redis_manager
+from config.sql_profiler import current_stats
+from models import api_key_owner
 
-class RateLimiterMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
-        self.redis = None
+logger = logging.getLogger()
 
-    async def get_redis(self):
-        if self.redis is None:
-            self.redis = from_url(str(settings.REDIS_URL), max_connections=settings.REDIS_POOL_SIZE)
-        return self.redis
 
-    async def dispatch(self, request: Request, call_next):
-        try:
-            redis = await self.get_redis()
-            client_ip = request.client.host
-            current_time = int(time.time())
-            key = f"rate_limit:{client_ip}"
-
-            data = await redis.hgetall(key)
-            if not data:
-                await redis.hset(key, mapping={"count": 1, "timestamp": current_time})
-                await redis.expire(key, settings.RATE_LIMIT_WINDOW)
-                return await call_next(request)
-
-            count = int(data.get("count", 0))
-            timestamp = int(data.get("timestamp", 0))
-
-            if current_time - timestamp > settings.RATE_LIMIT_WINDOW:
-                await redis.hset(key, mapping={"count": 1, "timestamp": current_time})
-                return await call_next(request)
-
-            if count >= settings.RATE_LIMIT_REQUESTS:
-                return JSONResponse(
-                    status_code=429,
-                    content={"detail": "Rate limit exceeded. Try again later."}
+class RateLimiterMiddleware:
+    def __init__(self, app: ASGIApp, limiter=None):
+        self.app = app
+        self.redis = None
+        self.limiter = limiter
+        self.injected = limiter is not None
+
+    async def get_limiter(self):
+        if self.injected:
+            return self.limiter
+        # Лимитер пересоздается, только если RedisManager выдал новый клиент
+        redis = redis_manager.client
+        if redis is not self.redis:
+            self.redis = redis
+            if self.limiter is not None:
+                # Иначе фоновая синхронизация старого лимитера работала бы
+                # со старым клиентом до конца процесса
+                await self.limiter.close()
+            if settings.RATE_LIMIT_BACKEND == "hybrid":
+                self.limiter = HybridRateLimiter(
+                    redis,
+                    sync_interval=settings.RATE_LIMIT_SYNC_INTERVAL_MS / 1000,
+                    breaker=redis_breaker
                 )
+            else:
+                self.limiter = RedisRateLimiter(redis, breaker=redis_breaker)
+        return self.limiter
 
-            await redis.hincrby(key, "count", 1)
-            
-            return await call_next(request)
-        except Exception as e:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        policy = resolve_policy(scope)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            limiter = await self.get_limiter()
+            result = await limiter.hit(
+                f"{policy.scope}:{client_key(scope, api_key_owner)}",
+                policy.limit,
+                policy.window,
+                policy.cost
+            )
+        except CircuitOpenError:
+            # Circuit открыт — Redis не опрашивается, запрос проходит без лимита
+            await self.app(scope, receive, send)
+            return
+        except RedisError as e:
             # If Redis is unavailable, allow the request to proceed without rate limiting
             print(f"Redis error in rate limiter: {e}")
-            return await call_next(request)
\ No newline at end of file
+            await self.app(scope, receive, send)
+            return
+        except Exception as e:
+            # Ошибка самого лимитера не должна ронять запрос
+            logger.exception({"event": "rate_limiter_failed", "path": scope["path"], "error": repr(e)})
+            await self.app(scope, receive, send)
+            return
+
+        if not result.allowed:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded. Try again later."},
+                headers=result.headers()
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(result.headers())
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class RequestLoggingMiddleware:
+    """Одна строка access-лога на запрос, пишется после завершения ответа.
+
+    Ошибки (статус >= 400 или исключение) пишутся всегда, успешные
+    запросы — с вероятностью `LOG_SAMPLE_RATE`.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: Optional[float] = None):
+        self.app = app
+        self.sample_rate = settings.LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_and_record(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            if status_code >= 400 or random.random() < self.sample_rate:
+                client = scope.get("client")
+                entry = {
+                    "event": "access",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope["query_string"].decode("latin-1"),
+                    "status_code": status_code,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                    "client": client[0] if client else None
+                }
+                stats = current_stats()
+                if stats is not None:
+                    entry["db_queries"] = stats.count
+                    entry["db_time_ms"] = round(stats.duration * 1000, 3)
+                logger.info(entry)
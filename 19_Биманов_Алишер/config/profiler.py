@@ -0,0 +1,161 @@
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Optional
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config.settings import settings
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Семплирующий профайлер одного потока.
+
+    Фоновый поток раз в `interval` секунд снимает стек целевого потока через
+    sys._current_frames() и считает одинаковые стеки. Целевой поток не
+    трассируется, поэтому накладные расходы не зависят от числа вызовов.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: Optional[float] = None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or settings.PROFILE_INTERVAL_MS / 1000
+        self.samples: Counter[tuple[str, ...]] = Counter()
+        self.started = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def start(self) -> "SamplingProfiler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def collapsed(self) -> str:
+        """Формат collapsed stacks для flamegraph.pl / speedscope / inferno."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+    def speedscope(self, name: str = "profile") -> dict:
+        """Профиль в формате speedscope (sampled), веса — секунды."""
+        frames: dict[str, int] = {}
+        samples, weights = [], []
+        for stack, count in self.samples.items():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": frame} for frame in frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": name,
+            "exporter": "notes-api",
+        }
+
+
+class ProfileStore:
+    """Последние профили запросов в памяти процесса."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.profiles: OrderedDict[str, SamplingProfiler] = OrderedDict()
+
+    def add(self, profiler: SamplingProfiler) -> str:
+        profile_id = uuid.uuid4().hex
+        self.profiles[profile_id] = profiler
+        while len(self.profiles) > self.size:
+            self.profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[SamplingProfiler]:
+        return self.profiles.get(profile_id)
+
+
+profile_store = ProfileStore(settings.PROFILE_STORE_SIZE)
+
+# Одновременно работает один профайлер процесса: /debug/profile или запрос
+# с X-Profile. Каждый профайлер — отдельный поток, семплирующий цикл событий
+profile_lock = asyncio.Lock()
+
+
+def _wants_profile(scope: Scope, secret: bytes) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return hmac.compare_digest(value, secret)
+    return False
+
+
+class RequestProfilingMiddleware:
+    """Профилирует запрос с заголовком `X-Profile: <PROFILE_REQUESTS_SECRET>`,
+    если PROFILE_REQUESTS_ENABLED и секрет задан.
+
+    Id профиля возвращается в заголовке `X-Profile-Id`, сам профиль доступен
+    администратору через /debug/profiles/{id}. Семплируется поток цикла
+    событий, поэтому в профиль попадают и конкурентные запросы. Пока идет
+    другое профилирование, запрос выполняется без профиля.
+    """
+
+    def __init__(self, app: ASGIApp, enabled: Optional[bool] = None, secret: Optional[str] = None):
+        self.app = app
+        self.secret = (settings.PROFILE_REQUESTS_SECRET if secret is None else secret).encode()
+        enabled = settings.PROFILE_REQUESTS_ENABLED if enabled is None else enabled
+        self.enabled = enabled and bool(self.secret)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not (
+            self.enabled and scope["type"] == "http"
+            and _wants_profile(scope, self.secret) and not profile_lock.locked()
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async with profile_lock:
+            await self._profile(scope, receive, send)
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send):
+        profiler = SamplingProfiler().start()
+        profile_id = None
+
+        async def send_with_profile(message: Message):
+            nonlocal profile_id
+            if message["type"] == "http.response.start":
+                profile_id = profile_store.add(profiler.stop())
+                MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            if profile_id is None:
+                profiler.stop()
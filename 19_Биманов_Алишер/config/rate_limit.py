@@ -0,0 +1,326 @@
+import asyncio
+import contextvars
+import logging
+import math
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Callable, Optional
+from jose import JWTError, jwt
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from starlette.routing import Match
+from starlette.types import Scope
+from config.settings import settings
+from config.redis_guard import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger("rate_limit")
+
+# GCRA (generic cell rate algorithm): в Redis хранится одно число — TAT
+# (theoretical arrival time). Скрипт выполняется атомарно за один round trip,
+# поэтому параллельные запросы не могут проскочить лимит.
+# KEYS[1] - ключ лимита; ARGV: limit, window (сек), cost
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local interval = window / limit
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + interval * cost
+local diff = now - (new_tat - window)
+if diff < 0 then
+    return {0, 0, tostring(tat - now), tostring(-diff)}
+end
+
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.max(1, math.ceil((new_tat - now) * 1000)))
+return {1, math.floor(diff / interval), tostring(new_tat - now), '0'}
+"""
+
+
+@dataclass(slots=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+async def _direct(func, *args, **kwargs):
+    return await func(*args, **kwargs)
+
+
+class RedisRateLimiter:
+    def __init__(self, redis: Redis, prefix: str = "rate_limit:", breaker: Optional[CircuitBreaker] = None):
+        self.prefix = prefix
+        self.script = redis.register_script(GCRA_SCRIPT)
+        self.call = breaker.call if breaker else _direct
+
+    async def close(self):
+        # Состояние только в Redis — останавливать нечего
+        pass
+
+    async def hit(self, key: str, limit: int, window: int, cost: int = 1) -> RateLimitResult:
+        allowed, remaining, reset_after, retry_after = await self.call(
+            self.script, keys=[f"{self.prefix}{key}"], args=[limit, window, cost]
+        )
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=limit,
+            remaining=int(remaining),
+            reset_after=float(reset_after),
+            retry_after=float(retry_after),
+        )
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "pending", "seen", "slot", "limit", "window")
+
+    def __init__(self, limit: int, window: int, now: float, slot: int, used: int):
+        self.limit = limit
+        self.window = window
+        self.tokens = float(limit - used)
+        self.updated = now
+        self.pending = 0
+        self.seen = used
+        self.slot = slot
+
+
+class HybridRateLimiter:
+    """Token bucket на каждом воркере с пакетной синхронизацией через Redis.
+
+    Запрос списывает токены только из локального bucket'а. Раз в
+    `sync_interval` секунд воркер одним pipeline отправляет в Redis
+    израсходованные токены (счетчик на окно) и вычитает из своего bucket'а
+    то, что за это время израсходовали другие воркеры. Bucket может уйти в
+    минус — перерасход между синхронизациями потом отрабатывается, поэтому
+    в среднем глобальный лимит соблюдается. Redis обязателен только для
+    первого запроса по новому ключу; при его недоступности лимит работает
+    локально на воркер.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        prefix: str = "rate_limit:hybrid:",
+        sync_interval: float = 0.1,
+        clock: Callable[[], float] = time.time,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.redis = redis
+        self.call = breaker.call if breaker else _direct
+        self.prefix = prefix
+        self.sync_interval = sync_interval
+        self.clock = clock
+        self.buckets: dict[str, _Bucket] = {}
+        self._task: asyncio.Task | None = None
+        _hybrid_limiters.add(self)
+
+    def _slot_key(self, key: str, slot: int) -> str:
+        return f"{self.prefix}{key}:{slot}"
+
+    async def _new_bucket(self, key: str, limit: int, window: int, now: float) -> _Bucket:
+        slot = int(now // window)
+        try:
+            used = int(await self.call(self.redis.get, self._slot_key(key, slot)) or 0)
+        except RedisError:
+            used = 0
+        return self.buckets.setdefault(key, _Bucket(limit, window, now, slot, min(used, limit)))
+
+    async def hit(self, key: str, limit: int, window: int, cost: int = 1) -> RateLimitResult:
+        if self._task is None:
+            # Пустой контекст: задача живет дольше запроса, который ее запустил,
+            # и не должна наследовать его таймер, трассировку и дедлайн
+            self._task = asyncio.create_task(self._sync_loop(), context=contextvars.Context())
+
+        now = self.clock()
+        rate = limit / window
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = await self._new_bucket(key, limit, window, now)
+        else:
+            bucket.tokens = min(limit, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            bucket.pending += cost
+            allowed, retry_after = True, 0.0
+        else:
+            allowed, retry_after = False, (cost - bucket.tokens) / rate
+
+        return RateLimitResult(
+            allowed=allowed,
+            limit=limit,
+            remaining=max(0, int(bucket.tokens)),
+            reset_after=(limit - bucket.tokens) / rate,
+            retry_after=retry_after,
+        )
+
+    async def sync(self):
+        """Отправляет израсходованные токены в Redis и учитывает чужие."""
+        if not self.buckets:
+            return
+        now = self.clock()
+        batch = []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, bucket in self.buckets.items():
+                slot = int(now // bucket.window)
+                slot_key = self._slot_key(key, slot)
+                pipe.incrby(slot_key, bucket.pending)
+                pipe.expire(slot_key, bucket.window * 2)
+                batch.append((key, bucket, slot, bucket.pending))
+                bucket.pending = 0
+            try:
+                replies = await self.call(pipe.execute)
+            except RedisError:
+                for _, bucket, _, sent in batch:
+                    bucket.pending += sent
+                raise
+
+        for (key, bucket, slot, sent), total in zip(batch, replies[::2]):
+            if slot != bucket.slot:
+                bucket.slot, bucket.seen = slot, 0
+            others = total - bucket.seen - sent
+            bucket.seen = total
+            if others > 0:
+                bucket.tokens = max(-bucket.limit, bucket.tokens - others)
+            if not bucket.pending and now - bucket.updated > bucket.window:
+                del self.buckets[key]
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except CircuitOpenError:
+                pass
+            except Exception as e:
+                # Любая ошибка синхронизации не должна останавливать цикл:
+                # без него лимит остается только локальным
+                logger.warning({"event": "rate_limit_sync_failed", "error": repr(e)})
+
+    async def close(self):
+        """Останавливает синхронизацию и отправляет в Redis остаток токенов."""
+        task, self._task = self._task, None
+        # Задача цикла, который уже закрыт, отменять некому
+        if task is not None and not task.get_loop().is_closed():
+            task.cancel()
+            if task.get_loop() is asyncio.get_running_loop():
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        try:
+            await self.sync()
+        except Exception as e:
+            logger.warning({"event": "rate_limit_sync_failed", "error": repr(e)})
+
+
+# Гибридные лимитеры процесса: lifespan закрывает их до закрытия Redis
+_hybrid_limiters: "weakref.WeakSet[HybridRateLimiter]" = weakref.WeakSet()
+
+
+async def close_limiters():
+    for limiter in list(_hybrid_limiters):
+        await limiter.close()
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitPolicy:
+    limit: int
+    window: int
+    cost: int = 1
+    scope: str = "default"
+
+
+DEFAULT_POLICY = RateLimitPolicy(settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_WINDOW)
+
+
+def rate_limit(
+    limit: Optional[int] = None,
+    window: Optional[int] = None,
+    cost: int = 1,
+    scope: Optional[str] = None,
+):
+    """Декоратор эндпоинта: собственный лимит и стоимость запроса.
+
+    Запросы к эндпоинтам с одинаковым `scope` расходуют общий bucket, для
+    остальных scope по умолчанию — имя функции. Ставится под `@router.*`.
+    """
+    def decorator(func):
+        func.__rate_limit__ = RateLimitPolicy(
+            limit=limit or settings.RATE_LIMIT_REQUESTS,
+            window=window or settings.RATE_LIMIT_WINDOW,
+            cost=cost,
+            scope=scope or func.__name__,
+        )
+        return func
+    return decorator
+
+
+def rate_limit_exempt(func):
+    """Декоратор эндпоинта, который не ограничивается лимитером."""
+    func.__rate_limit__ = None
+    return func
+
+
+def resolve_policy(scope: Scope) -> Optional[RateLimitPolicy]:
+    if scope["path"] in settings.RATE_LIMIT_EXEMPT_PATHS:
+        return None
+    app = scope.get("app")
+    if app is None:
+        return DEFAULT_POLICY
+    for route in app.router.routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(child_scope.get("endpoint"), "__rate_limit__", DEFAULT_POLICY)
+    return DEFAULT_POLICY
+
+
+def client_key(scope: Scope, api_key_owner: Optional[Callable[[str], Optional[str]]] = None) -> str:
+    """Ключ клиента: пользователь из JWT, проверенного API-ключа или, иначе, IP.
+
+    Непроверенный API-ключ не дает своего bucket'а: иначе случайный ключ на
+    каждый запрос обходил бы лимит по IP. `api_key_owner` возвращает
+    владельца ключа, если ключ уже прошел аутентификацию, иначе None.
+    """
+    token = api_key = None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, credentials = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                token = credentials
+        elif name == b"x-api-key":
+            api_key = value.decode("latin-1")
+    if api_key and api_key_owner is not None:
+        owner = api_key_owner(api_key)
+        if owner:
+            return f"user:{owner}"
+    elif token:
+        try:
+            username = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]).get("sub")
+        except JWTError:
+            username = None
+        if username:
+            return f"user:{username}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
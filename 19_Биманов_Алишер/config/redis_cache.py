@@ -1,52 +1,102 @@
-from redis.asyncio import Redis, from_url
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 from fastapi import Request, Response
 from functools import wraps
 import pickle
 import json
 from typing import Optional, Callable, Any
 import hashlib
+from sqlmodel import SQLModel
+from config.redis_guard import CircuitBreaker, CircuitOpenError, redis_breaker
+
+def _key_arg(value: Any):
+    # В ключ кеша попадают только параметры запроса и id моделей
+    # (например, current_user) — сессия БД и прочие объекты пропускаются
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return value
+    if isinstance(value, SQLModel):
+        return getattr(value, "id", None)
+    return None
+
+# Поколение живет дольше любой записи кеша; после истечения счетчик
+# обнуляется, и старые записи с ним не совпадут
+GENERATION_TTL = 86400
+
+
+def _generation_key(prefix: str, scope_value: Any = None) -> str:
+    if scope_value is None:
+        return f"{prefix}:generation"
+    return f"{prefix}:generation:{scope_value}"
 
 class RedisCache:
-    def __init__(self):
+    def __init__(self, breaker: CircuitBreaker = redis_breaker):
         self.redis: Optional[Redis] = None
+        self.breaker = breaker
 
-    async def init_redis(self, url: str):
-        self.redis = from_url(url)
+    async def init_redis(self, redis: Redis):
+        # Клиент и пул принадлежат RedisManager — кеш их не закрывает
+        self.redis = redis
         return self
 
     async def close(self):
-        if self.redis:
-            await self.redis.close()
+        self.redis = None
+
+    def cache(self, key_prefix: str = "", ttl: int = 300, scope: Optional[str] = None):
+        """Кеширует результат функции по ее kwargs.
 
-    def cache(self, key_prefix: str = "", ttl: int = 300):
+        Запись хранится вместе с поколениями префикса и, если задан `scope`
+        (имя kwarg, например owner_id), поколением этого значения. Запись
+        действительна, пока поколения не изменились: `invalidate` только
+        увеличивает счетчик, без поиска ключей. Запись и поколения читаются
+        одним MGET.
+        """
         def decorator(func: Callable):
             @wraps(func)
             async def wrapper(*args, **kwargs):
                 if not self.redis:
                     raise RuntimeError("Redis not initialized")
                 
-                cache_key = f"{key_prefix}:{func.__name__}:{hashlib.md5(json.dumps(kwargs).encode()).hexdigest()}"
+                key_args = {name: _key_arg(value) for name, value in kwargs.items()}
+                cache_key = f"{key_prefix}:{func.__name__}:{hashlib.md5(json.dumps(key_args, sort_keys=True).encode()).hexdigest()}"
+                generation_keys = [_generation_key(key_prefix)]
+                if scope is not None:
+                    generation_keys.append(_generation_key(key_prefix, key_args.get(scope)))
                 
-                cached = await self.redis.get(cache_key)
+                # Redis недоступен или медленный — отдаем результат без кеша
+                try:
+                    cached, *generations = await self.breaker.call(self.redis.mget, cache_key, *generation_keys)
+                except RedisError as e:
+                    if not isinstance(e, CircuitOpenError):
+                        print(f"Redis error in cache: {e}")
+                    return await func(*args, **kwargs)
                 if cached:
-                    return pickle.loads(cached)
+                    cached_generations, result = pickle.loads(cached)
+                    if cached_generations == generations:
+                        return result
                 
+                # Поколения прочитаны до вызова: изменение во время вызова
+                # сделает сохраненную запись устаревшей
                 result = await func(*args, **kwargs)
                 
-                await self.redis.setex(cache_key, ttl, pickle.dumps(result))
+                try:
+                    await self.breaker.call(self.redis.setex, cache_key, ttl, pickle.dumps((generations, result)))
+                except RedisError:
+                    pass
                 return result
             return wrapper
         return decorator
 
-    async def invalidate(self, prefix: str):
+    async def invalidate(self, prefix: str, scope_value: Any = None):
+        """Делает устаревшими записи префикса (или только одного значения scope)."""
         if not self.redis:
             return
-        
-        keys = []
-        async for key in self.redis.scan_iter(f"{prefix}:*"):
-            keys.append(key)
-        
-        if keys:
-            await self.redis.delete(*keys)
+        key = _generation_key(prefix) if scope_value is None else _generation_key(prefix, scope_value)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.incr(key)
+                pipe.expire(key, GENERATION_TTL)
+                await self.breaker.call(pipe.execute)
+        except RedisError as e:
+            print(f"Redis error in cache invalidation: {e}")
 
 redis_cache = RedisCache()
\ No newline at end of file
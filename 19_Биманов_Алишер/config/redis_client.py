@@ -0,0 +1,86 @@
+import asyncio
+import time
+from typing import Optional
+from prometheus_client import Gauge, Histogram
+from redis.asyncio import BlockingConnectionPool, Redis
+from config.settings import settings
+
+REDIS_POOL_WAIT = Histogram(
+    "redis_pool_wait_seconds",
+    "Время ожидания свободного соединения в пуле Redis",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+REDIS_POOL_IN_USE = Gauge(
+    "redis_pool_connections_in_use",
+    "Соединения Redis, выданные из пула",
+    multiprocess_mode="livesum"
+)
+
+
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    """BlockingConnectionPool, который отдает метрики ожидания и занятости.
+
+    При исчерпании пула запрос ждет соединение до `timeout` секунд вместо
+    открытия нового сокета, поэтому число соединений с Redis ограничено
+    `max_connections` на процесс.
+    """
+
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        connection = await super().get_connection(command_name, *keys, **options)
+        REDIS_POOL_WAIT.observe(time.perf_counter() - start)
+        REDIS_POOL_IN_USE.inc()
+        return connection
+
+    async def release(self, connection):
+        await super().release(connection)
+        REDIS_POOL_IN_USE.dec()
+
+
+class RedisManager:
+    """Единственный клиент Redis процесса: кеш, rate limiter и зависимости
+    FastAPI работают через общий пул соединений."""
+
+    def __init__(self):
+        self.pool: Optional[InstrumentedConnectionPool] = None
+        self._client: Optional[Redis] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.url: Optional[str] = None
+
+    def connect(self, url: Optional[str] = None) -> Redis:
+        # Пул ждет соединения на asyncio.Condition, привязанном к циклу событий,
+        # поэтому в новом цикле (например, у TestClient) создается новый пул
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            self.url = url or self.url or str(settings.REDIS_URL)
+            self.pool = InstrumentedConnectionPool.from_url(
+                self.url,
+                max_connections=settings.REDIS_POOL_SIZE,
+                timeout=settings.REDIS_POOL_TIMEOUT,
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                socket_keepalive=True
+            )
+            self._client = Redis(connection_pool=self.pool)
+        return self._client
+
+    @property
+    def client(self) -> Redis:
+        # Пул создается без сетевых вызовов, поэтому его можно поднять лениво,
+        # если приложение запущено без lifespan (например, в тестах)
+        return self.connect()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            await self.pool.disconnect()
+            self._client = None
+            self.pool = None
+
+
+redis_manager = RedisManager()
+
+
+async def get_redis() -> Redis:
+    """Зависимость FastAPI: общий клиент Redis, соединение берется из пула на время команды."""
+    return redis_manager.client
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+from prometheus_client import Counter, Gauge
+from redis.exceptions import ConnectionError as RedisConnectionError, RedisError, TimeoutError as RedisTimeoutError
+from config.settings import settings
+from config.timing import timed
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = Gauge(
+    "redis_circuit_state",
+    "Состояние circuit breaker'а Redis: 0 - closed, 1 - half-open, 2 - open",
+    ["name"],
+    multiprocess_mode="livemax"
+)
+CIRCUIT_CALLS = Counter(
+    "redis_circuit_calls_total",
+    "Вызовы Redis через circuit breaker по результату",
+    ["name", "outcome"]
+)
+
+
+class CircuitOpenError(RedisError):
+    """Redis не вызывался: circuit открыт, вызывающий код должен работать без него."""
+
+
+class CircuitBreaker:
+    """Circuit breaker с бюджетом времени на каждый вызов Redis.
+
+    closed    - вызовы идут в Redis; каждый ограничен `call_timeout` секундами.
+                После `failure_threshold` ошибок или таймаутов подряд
+                circuit открывается.
+    open      - вызовы сразу завершаются CircuitOpenError, не дожидаясь
+                Redis. Через `reset_timeout` секунд circuit переходит
+                в half-open.
+    half_open - в Redis пропускается один пробный вызов: успех закрывает
+                circuit, ошибка снова открывает его.
+
+    CircuitOpenError и таймауты — подклассы RedisError, поэтому существующие
+    `except RedisError` работают без изменений.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 5.0,
+        call_timeout: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = CLOSED
+        self._probe = False
+        CIRCUIT_STATE.labels(name).set(_STATE_VALUES[CLOSED])
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        return self._state
+
+    def _set_state(self, state: str):
+        self._state = state
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+
+    def _on_success(self):
+        self.failures = 0
+        if self._state != CLOSED:
+            self._set_state(CLOSED)
+
+    def _on_failure(self):
+        self.failures += 1
+        if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+            self._set_state(OPEN)
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._probe):
+            CIRCUIT_CALLS.labels(self.name, "rejected").inc()
+            raise CircuitOpenError(f"Redis circuit '{self.name}' is open")
+
+        self._probe = state == HALF_OPEN
+        try:
+            with timed("redis"):
+                result = await asyncio.wait_for(func(*args, **kwargs), self.call_timeout)
+        except asyncio.TimeoutError:
+            CIRCUIT_CALLS.labels(self.name, "timeout").inc()
+            self._on_failure()
+            raise RedisTimeoutError(f"Redis call exceeded {self.call_timeout * 1000:.0f} ms")
+        except RedisError:
+            CIRCUIT_CALLS.labels(self.name, "failure").inc()
+            self._on_failure()
+            raise
+        except OSError as e:
+            CIRCUIT_CALLS.labels(self.name, "failure").inc()
+            self._on_failure()
+            raise RedisConnectionError(str(e)) from e
+        finally:
+            self._probe = False
+        CIRCUIT_CALLS.labels(self.name, "success").inc()
+        self._on_success()
+        return result
+
+
+redis_breaker = CircuitBreaker(
+    "redis",
+    failure_threshold=settings.REDIS_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.REDIS_CIRCUIT_RESET_SECONDS,
+    call_timeout=settings.REDIS_CALL_TIMEOUT_MS / 1000,
+)
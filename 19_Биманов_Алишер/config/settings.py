@@ -9,14 +9,72 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    API_KEY_PREFIX: str = "nk_"
+    API_KEY_CACHE_TTL: int = 300
+    API_KEY_CACHE_SIZE: int = 10000
+
     DATABASE_URL: str = Field(..., env="DATABASE_URL")
     DB_POOL_SIZE: int = 5
     DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800  # секунды; -1 — без переоткрытия
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_WARMUP: int = 5  # соединений, открываемых при старте
+    DB_STATEMENT_CACHE_SIZE: int = 100  # asyncpg; 0 для pgbouncer (transaction)
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 500  # подготовленные выражения SQLAlchemy на соединение
+    DB_STATEMENT_TIMEOUT_MS: int = 0  # statement_timeout соединения; 0 — без предела
+    DB_DEADLINE_TIMEOUT_THRESHOLD_MS: int = 5000  # SET LOCAL по дедлайну, когда бюджета меньше
+    DB_GROUP_COMMIT_ENABLED: bool = False  # групповая вставка заметок
+    DB_GROUP_COMMIT_DELAY_MS: float = 5.0
+    DB_GROUP_COMMIT_MAX_ROWS: int = 100
+    DATABASE_REPLICA_URLS: list[str] = []
+    DB_READ_YOUR_WRITES_SECONDS: float = 5.0
+    DB_REPLICA_LAG_INTERVAL_SECONDS: float = 5.0
+    DB_REPLICA_MAX_LAG_SECONDS: float = 10.0
+    DB_ECHO: bool = False
+    DB_STARTUP_MODE: str = "create_all"  # create_all | check | skip; check — после migrate.py
+    SQL_SLOW_QUERY_MS: int = 100
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5
 
     REDIS_URL: RedisDsn = Field(..., env="REDIS_URL")
     REDIS_POOL_SIZE: int = 5
+    REDIS_POOL_TIMEOUT: float = 1.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    REDIS_CALL_TIMEOUT_MS: int = 50
+    REDIS_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    REDIS_CIRCUIT_RESET_SECONDS: float = 5.0
     RATE_LIMIT_REQUESTS: int = Field(..., env="RATE_LIMIT_REQUESTS")
     RATE_LIMIT_WINDOW: int = Field(..., env="RATE_LIMIT_WINDOW")
+    RATE_LIMIT_BACKEND: str = "redis"  # redis | hybrid
+    RATE_LIMIT_SYNC_INTERVAL_MS: int = 100
+    RATE_LIMIT_EXEMPT_PATHS: list[str] = ["/health", "/metrics"]
+
+    AUTOSAVE_FLUSH_DELAY_SECONDS: float = 10.0  # сколько копить изменения заметки
+    AUTOSAVE_FLUSH_INTERVAL_SECONDS: float = 1.0
+    AUTOSAVE_BATCH_SIZE: int = 500
+    AUTOSAVE_BUFFER_TTL: int = 86400
+
+    REQUEST_TIMEOUT_SECONDS: float = 30.0  # дедлайн запроса по умолчанию
+
+    LOG_LEVEL: str = "INFO"
+    LOG_SAMPLE_RATE: float = 1.0  # доля успешных запросов в access-логе
+
+    LOOP_LAG_INTERVAL_MS: int = 100
+    LOOP_LAG_THRESHOLD_MS: int = 250
+
+    TRACING_ENABLED: bool = False
+    TRACING_SERVICE_NAME: str = "notes-api"
+    TRACING_SAMPLE_RATIO: float = 0.1
+    TRACING_EXPORTER: str = "file"  # file | otlp
+    TRACING_FILE: str = "traces.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_EXCLUDED_URLS: str = "/metrics,/health"
+
+    PROFILE_INTERVAL_MS: int = 5
+    PROFILE_MAX_SECONDS: int = 60
+    PROFILE_REQUESTS_ENABLED: bool = False
+    PROFILE_REQUESTS_SECRET: str = ""  # значение X-Profile; пустое — заголовок игнорируется
+    PROFILE_STORE_SIZE: int = 20
 
     CORS_ORIGINS: str = "*"
     CORS_METHODS: str = "*"
@@ -0,0 +1,154 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import APIRoute
+from prometheus_client import Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config.settings import settings
+from config.metrics import is_excluded, route_label
+
+COMPONENT_SECONDS = Histogram(
+    "http_request_component_seconds",
+    "Время запроса по компонентам: middleware, app, auth, db, redis, serialize",
+    ["route", "component"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+
+class RequestTimer:
+    """Исключающий учет времени: вложенный компонент приостанавливает внешний,
+    поэтому сумма компонентов равна общему времени запроса."""
+
+    __slots__ = ("totals", "stack")
+
+    def __init__(self, base: str):
+        self.totals: dict[str, float] = defaultdict(float)
+        self.stack: list[list] = [[base, time.perf_counter()]]
+
+    def push(self, component: str):
+        now = time.perf_counter()
+        top = self.stack[-1]
+        self.totals[top[0]] += now - top[1]
+        self.stack.append([component, now])
+
+    def pop(self):
+        now = time.perf_counter()
+        component, start = self.stack.pop()
+        self.totals[component] += now - start
+        self.stack[-1][1] = now
+
+    def snapshot(self) -> dict[str, float]:
+        totals = dict(self.totals)
+        component, start = self.stack[-1]
+        totals[component] = totals.get(component, 0.0) + time.perf_counter() - start
+        return totals
+
+
+_timer: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+
+
+@contextmanager
+def timed(component: str):
+    """Относит время блока к компоненту текущего запроса (вне запроса — no-op)."""
+    timer = _timer.get()
+    if timer is None:
+        yield
+        return
+    timer.push(component)
+    try:
+        yield
+    finally:
+        timer.pop()
+
+
+def instrument_engine(engine: Engine):
+    """Время выполнения SQL относится к компоненту db."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timer = _timer.get()
+        if timer is not None:
+            timer.push("db")
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timer = _timer.get()
+        if timer is not None and timer.stack[-1][0] == "db":
+            timer.pop()
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        timer = _timer.get()
+        if timer is not None and timer.stack[-1][0] == "db":
+            timer.pop()
+
+
+class TimedRoute(APIRoute):
+    """Время внутри обработчика маршрута (зависимости и эндпоинт) — компонент app."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            with timed("app"):
+                return await handler(request)
+
+        return timed_handler
+
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        with timed("serialize"):
+            return super().render(content)
+
+
+class TimedORJSONResponse(ORJSONResponse):
+    """Ответ, который эндпоинт собирает сам, минуя response_model."""
+
+    def render(self, content) -> bytes:
+        with timed("serialize"):
+            return super().render(content)
+
+
+class TimingMiddleware:
+    """Внешний middleware: разбивка времени запроса по компонентам.
+
+    Все, что не попало в компоненты, считается временем middleware. Итоги
+    пишутся в гистограмму `http_request_component_seconds`, а при DEBUG
+    отдаются клиенту в заголовке Server-Timing.
+    """
+
+    def __init__(self, app: ASGIApp, server_timing: Optional[bool] = None):
+        self.app = app
+        self.server_timing = settings.DEBUG if server_timing is None else server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = RequestTimer("middleware")
+        token = _timer.set(timer)
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start" and self.server_timing:
+                totals = timer.snapshot()
+                metrics = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in totals.items()]
+                metrics.append(f"total;dur={sum(totals.values()) * 1000:.2f}")
+                MutableHeaders(scope=message).append("Server-Timing", ", ".join(metrics))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timer.reset(token)
+            if not is_excluded(scope["path"]):
+                label = route_label(scope)
+                for component, seconds in timer.snapshot().items():
+                    COMPONENT_SECONDS.labels(label, component).observe(seconds)
@@ -0,0 +1,83 @@
+import json
+import threading
+from typing import Sequence
+from opentelemetry import trace
+from config.settings import settings
+
+tracer = trace.get_tracer("notes-api")
+
+_provider = None
+
+
+def _file_exporter(path: str):
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+    class FileSpanExporter(SpanExporter):
+        """Спаны построчно в JSON-файл: трассировка без внешнего коллектора."""
+
+        def __init__(self, path: str):
+            self.path = path
+            self._lock = threading.Lock()
+
+        def export(self, spans: Sequence) -> "SpanExportResult":
+            lines = "".join(json.dumps(json.loads(span.to_json())) + "\n" for span in spans)
+            with self._lock, open(self.path, "a", encoding="utf-8") as file:
+                file.write(lines)
+            return SpanExportResult.SUCCESS
+
+    return FileSpanExporter(path)
+
+
+def _exporter():
+    if settings.TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    return _file_exporter(settings.TRACING_FILE)
+
+
+def setup_tracing(app=None, engine=None, exporter=None):
+    """Включает OpenTelemetry, если TRACING_ENABLED.
+
+    Сэмплирование головное: решение принимается в начале трассы с долей
+    TRACING_SAMPLE_RATIO и наследуется дочерними спанами, в том числе в
+    задачах Celery — контекст передается в заголовках задачи.
+    Инструментируются HTTP и WebSocket (ASGI), SQLAlchemy, Redis и Celery.
+    """
+    global _provider
+    if not settings.TRACING_ENABLED:
+        return None
+
+    from opentelemetry.instrumentation.celery import CeleryInstrumentor
+    from opentelemetry.instrumentation.redis import RedisInstrumentor
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if _provider is None:
+        _provider = TracerProvider(
+            resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME}),
+            sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO))
+        )
+        _provider.add_span_processor(BatchSpanProcessor(exporter or _exporter()))
+        trace.set_tracer_provider(_provider)
+        RedisInstrumentor().instrument(tracer_provider=_provider)
+        CeleryInstrumentor().instrument(tracer_provider=_provider)
+
+    if app is not None:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        FastAPIInstrumentor.instrument_app(
+            app,
+            tracer_provider=_provider,
+            excluded_urls=settings.TRACING_EXCLUDED_URLS
+        )
+    if engine is not None:
+        from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+        SQLAlchemyInstrumentor().instrument(engine=engine.sync_engine, tracer_provider=_provider)
+    return _provider
+
+
+def shutdown_tracing():
+    """Отправляет накопленные спаны перед остановкой процесса."""
+    if _provider is not None:
+        _provider.shutdown()
@@ -0,0 +1,105 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from config.profiler import SamplingProfiler, profile_lock, profile_store
+from config.settings import settings
+from config.timing import TimedRoute
+from models import User, require_role
+
+router = APIRouter(
+    route_class=TimedRoute,
+    prefix="/debug",
+    tags=["debug"]
+)
+
+def render_profile(profiler: SamplingProfiler, format: str, name: str):
+    if format == "speedscope":
+        return JSONResponse(
+            profiler.speedscope(name),
+            headers={"Content-Disposition": f'attachment; filename="{name}.speedscope.json"'}
+        )
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="{name}.collapsed.txt"'}
+    )
+
+
+@router.get(
+    "/profile",
+    summary="Профилирование воркера",
+    description="""
+    Семплирует стек потока цикла событий этого воркера в течение `seconds`
+    секунд и возвращает профиль.
+
+    Форматы:
+    - collapsed: collapsed stacks для flamegraph.pl, inferno, speedscope
+    - speedscope: JSON для https://www.speedscope.app
+
+    Доступно только администраторам. Одновременно выполняется не больше
+    одного профилирования на воркер.
+    """,
+    responses={
+        403: {
+            "description": "Нет прав доступа",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Operation not permitted"}
+                }
+            }
+        },
+        409: {
+            "description": "Профилирование уже выполняется",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Profiling already in progress"}
+                }
+            }
+        }
+    }
+)
+async def profile(
+    seconds: float = Query(10, gt=0, le=settings.PROFILE_MAX_SECONDS, description="Длительность профилирования"),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$", description="Формат профиля"),
+    current_user: User = Depends(require_role("admin"))
+):
+    """Профилирование потока цикла событий"""
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="Profiling already in progress")
+    async with profile_lock:
+        profiler = SamplingProfiler().start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+    return render_profile(profiler, format, "worker")
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    summary="Профиль отдельного запроса",
+    description="""
+    Возвращает профиль запроса, отправленного с заголовком `X-Profile: 1`
+    (при включенном PROFILE_REQUESTS_ENABLED). Id профиля приходит в
+    заголовке ответа `X-Profile-Id`; профили хранятся в памяти воркера.
+    """,
+    responses={
+        404: {
+            "description": "Профиль не найден",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Profile not found"}
+                }
+            }
+        }
+    }
+)
+async def get_profile(
+    profile_id: str,
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$", description="Формат профиля"),
+    current_user: User = Depends(require_role("admin"))
+):
+    """Профиль отдельного запроса"""
+    profiler = profile_store.get(profile_id)
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return render_profile(profiler, format, profile_id)
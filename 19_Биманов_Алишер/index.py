@@ -1,24 +1,24 @@
-import logging
-import json
-from pythonjsonlogger import jsonlogger
-from fastapi import FastAPI, Request
-from prometheus_fastapi_instrumentator import Instrumentator
-from metadata import lifespan
+from fastapi import FastAPI
+from metadata import lifespan, engine
 from users import router as users_router
 from notes import router as notes_router
 from websocket.webs import router as ws_router
+from debug import router as debug_router
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
 from config.settings import settings
-from config.middleware import RateLimiterMiddleware
+from config.middleware import RateLimiterMiddleware, RequestLoggingMiddleware
+from config.logs import setup_logging
+from config.metrics import setup_metrics
+from config.timing import TimingMiddleware, TimedRoute, TimedJSONResponse
+from config.sql_profiler import SQLProfilerMiddleware
+from config.db_routing import ReadRoutingMiddleware
+from config.deadline import DeadlineMiddleware
+from config.profiler import RequestProfilingMiddleware
+from config.tracing import setup_tracing
 
 
-logger = logging.getLogger()
-logHandler = logging.StreamHandler()
-formatter = jsonlogger.JsonFormatter()
-logHandler.setFormatter(formatter)
-logger.handlers = [logHandler]
-logger.setLevel(logging.INFO)
+setup_logging()
 
 # Создаем FastAPI приложение с детальной информацией для OpenAPI
 app = FastAPI(
@@ -71,27 +71,23 @@ app = FastAPI(
             "name": "health",
             "description": "Проверка состояния сервиса и мониторинг",
         },
+        {
+            "name": "debug",
+            "description": "Профилирование воркера, только для администраторов",
+        },
     ],
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse
 )
+app.router.route_class = TimedRoute
+
+# Дедлайн ближе всего к приложению: 504 попадает в access-лог
+app.add_middleware(DeadlineMiddleware)
 
 # Add the rate limiter middleware
 app.add_middleware(RateLimiterMiddleware)
 
-
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    logger.info({
-        "event": "request",
-        "method": request.method,
-        "url": str(request.url)
-    })
-    response = await call_next(request)
-    logger.info({
-        "event": "response",
-        "status_code": response.status_code
-    })
-    return response
+app.add_middleware(RequestLoggingMiddleware)
 
 
 @app.get(
@@ -128,11 +124,12 @@ def health():
     }
 
 
-Instrumentator().instrument(app).expose(app)
+setup_metrics(app)
 
 app.include_router(users_router)
 app.include_router(notes_router)
 app.include_router(ws_router)
+app.include_router(debug_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -142,5 +139,14 @@ app.add_middleware(
     allow_headers=settings.CORS_HEADERS,
 )
 
+app.add_middleware(ReadRoutingMiddleware)
+app.add_middleware(SQLProfilerMiddleware)
+app.add_middleware(RequestProfilingMiddleware)
+
+# Самый внешний middleware — считает время всех остальных
+app.add_middleware(TimingMiddleware)
+
+setup_tracing(app, engine)
+
 if __name__ == "__main__":
     uvicorn.run("index:app", reload=True)
\ No newline at end of file
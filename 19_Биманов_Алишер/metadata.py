@@ -3,7 +3,7 @@ from dotenv import load_dotenv
 import os
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from typing import Optional, Annotated
 from sqlalchemy.orm import DeclarativeBase
 from fastapi import Depends
@@ -11,7 +11,15 @@ from sqlmodel import SQLModel
 from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import AsyncSession
 from config.redis_cache import redis_cache
+from config.redis_client import redis_manager
+from config.autosave import autosave_buffer
+from config.loop_monitor import loop_monitor
+from config.tracing import shutdown_tracing
 from config.settings import settings
+from config.database import LazySession, create_engine, warm_up_pool
+from config.db_routing import replica_monitor, routing_session_class
+from config.rate_limit import close_limiters
+from config.migrations import check_schema
 load_dotenv()
 
 CURRENT_DATETIME = datetime.now(UTC)  
@@ -23,28 +31,59 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 DATABASE_URL = str(settings.DATABASE_URL)
-engine = create_async_engine(DATABASE_URL, echo=True)
-session_factory = async_sessionmaker(bind=engine, expire_on_commit=False, autoflush=False)
+engine = create_engine(DATABASE_URL)
+replica_engines = [
+    create_engine(url, name=f"replica-{index}")
+    for index, url in enumerate(settings.DATABASE_REPLICA_URLS)
+]
+# GET-запросы читают с реплик, запись и read-your-writes — через primary
+session_factory = async_sessionmaker(
+    bind=engine,
+    sync_session_class=routing_session_class(engine, replica_engines),
+    expire_on_commit=False,
+    autoflush=False
+)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 async def get_db():
-    async with session_factory() as session:
+    # Соединение берется из пула при первом запросе к БД и возвращается
+    # сразу после чтения, а не после отправки ответа
+    session = LazySession(session_factory)
+    try:
         yield session
+    finally:
+        await session.close()
 
-SessionDep = Annotated[AsyncSession, Depends(get_db)]
+SessionDep = Annotated[LazySession, Depends(get_db)]
 
 class Base(DeclarativeBase):
     pass
 
 @asynccontextmanager
 async def lifespan(app):
-    await redis_cache.init_redis(str(settings.REDIS_URL))
+    await loop_monitor.start()
+    await redis_cache.init_redis(redis_manager.connect())
     
-    async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
+    if settings.DB_STARTUP_MODE == "check":
+        await check_schema(engine)
+    elif settings.DB_STARTUP_MODE == "create_all":
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+    for db_engine in (engine, *replica_engines):
+        await warm_up_pool(db_engine)
+    await replica_monitor.start(replica_engines)
+    await autosave_buffer.start(session_factory)
     
     yield
     
+    await autosave_buffer.stop()
+    await replica_monitor.stop()
+    await close_limiters()
     await redis_cache.close()
-    await engine.dispose()
\ No newline at end of file
+    await redis_manager.close()
+    await engine.dispose()
+    for replica in replica_engines:
+        await replica.dispose()
+    await loop_monitor.stop()
+    shutdown_tracing()
\ No newline at end of file
@@ -1,7 +1,14 @@
-from sqlalchemy import select
+from sqlalchemy import lambda_stmt, select
 from sqlmodel import SQLModel, Field, Relationship
 from pydantic import BaseModel, Field as PydanticField
-from typing import Optional, List
+from typing import Optional, List, Union
+from dataclasses import dataclass
+from redis.exceptions import RedisError
+import hashlib
+import hmac
+import logging
+import secrets
+import time
 from metadata import (
     CURRENT_DATETIME,
     SECRET_KEY,
@@ -14,10 +21,17 @@ from metadata import (
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from datetime import timedelta, datetime
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import OAuth2PasswordBearer, APIKeyHeader
 from sqlalchemy.ext.asyncio import AsyncSession
+from config.redis_client import redis_manager
+from config.redis_guard import redis_breaker
+from config.settings import settings
+from config.timing import timed
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+logger = logging.getLogger("auth")
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
+api_key_scheme = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 # Database Models
 class User(SQLModel, table=True):
@@ -63,8 +77,48 @@ class Note(SQLModel, table=True):
         foreign_key="user.id",
         description="ID владельца заметки"
     )
+    version: int = Field(
+        default=1,
+        sa_column_kwargs={"server_default": "1"},
+        description="Версия заметки, растет при каждом изменении"
+    )
     owner: Optional[User] = Relationship(back_populates="notes")
 
+class ApiKey(SQLModel, table=True):
+    """Модель API-ключа сервисного аккаунта"""
+    id: Optional[int] = Field(
+        primary_key=True,
+        default=None,
+        description="Уникальный идентификатор ключа"
+    )
+    name: str = Field(
+        max_length=100,
+        description="Название ключа (например, имя batch-задачи)"
+    )
+    prefix: str = Field(
+        max_length=16,
+        description="Публичная часть ключа для идентификации"
+    )
+    key_hash: str = Field(
+        index=True,
+        unique=True,
+        max_length=64,
+        description="HMAC-SHA256 от ключа"
+    )
+    owner_id: int = Field(
+        foreign_key="user.id",
+        index=True,
+        description="ID владельца ключа"
+    )
+    created_at: datetime = Field(
+        default_factory=datetime.utcnow,
+        description="Дата создания ключа"
+    )
+    revoked: bool = Field(
+        default=False,
+        description="Ключ отозван"
+    )
+
 # Pydantic Models для API
 class UserCreate(BaseModel):
     """Модель для создания нового пользователя"""
@@ -197,6 +251,10 @@ class NoteOut(BaseModel):
         description="ID владельца заметки",
         example=1
     )
+    version: int = PydanticField(
+        description="Версия заметки, она же ETag",
+        example=1
+    )
     
     class Config:
         json_schema_extra = {
@@ -204,7 +262,8 @@ class NoteOut(BaseModel):
                 "id": 1,
                 "title": "Моя заметка",
                 "content": "Содержимое заметки",
-                "owner_id": 1
+                "owner_id": 1,
+                "version": 1
             }
         }
 
@@ -228,6 +287,46 @@ class Token(BaseModel):
         }
 
 
+class ApiKeyCreate(BaseModel):
+    """Модель для выпуска нового API-ключа"""
+    name: str = PydanticField(
+        min_length=1,
+        max_length=100,
+        description="Название ключа",
+        example="nightly-export"
+    )
+
+class ApiKeyOut(BaseModel):
+    """Модель API-ключа для ответа API (без секрета)"""
+    id: int = PydanticField(
+        description="Уникальный идентификатор ключа",
+        example=1
+    )
+    name: str = PydanticField(
+        description="Название ключа",
+        example="nightly-export"
+    )
+    prefix: str = PydanticField(
+        description="Публичная часть ключа",
+        example="nk_AbCdEfGh"
+    )
+    created_at: datetime = PydanticField(
+        description="Дата создания ключа",
+        example="2025-07-13T23:30:00"
+    )
+    revoked: bool = PydanticField(
+        description="Ключ отозван",
+        example=False
+    )
+
+class ApiKeyCreated(ApiKeyOut):
+    """Выпущенный API-ключ. Секрет возвращается только один раз"""
+    key: str = PydanticField(
+        description="API-ключ для заголовка X-API-Key",
+        example="nk_AbCdEfGh..."
+    )
+
+
 # Helper functions
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -236,10 +335,91 @@ def verify_password(password: str, hashed_password: str) -> bool:
     return pwd_context.verify(password, hashed_password)
 
 async def get_user(username: str, session: AsyncSession):
-    stmt = select(User).where(User.username == username)
+    stmt = lambda_stmt(lambda: select(User).where(User.username == username))
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
+def generate_api_key() -> str:
+    return f"{settings.API_KEY_PREFIX}{secrets.token_urlsafe(32)}"
+
+def hash_api_key(key: str) -> str:
+    # HMAC вместо bcrypt: ключ и так содержит 256 бит энтропии,
+    # поэтому медленный хеш не нужен, а дайджест ищется по индексу за O(1)
+    return hmac.new(SECRET_KEY.encode(), key.encode(), hashlib.sha256).hexdigest()
+
+@dataclass(frozen=True)
+class Principal:
+    """Неизменяемая копия владельца API-ключа для кеша: ORM-объект привязан
+    к сессии, в которой загружен, и не делится между запросами."""
+    id: int
+    username: str
+    role: str
+
+# key_hash -> (expires_at, principal). Кеш на процесс, чтобы горячие
+# сервисные клиенты не ходили в БД на каждый запрос
+_api_key_cache: dict[str, tuple[float, Principal]] = {}
+
+def _revoked_key(key_hash: str) -> str:
+    return f"api_key:revoked:{key_hash}"
+
+def invalidate_api_key(key_hash: str):
+    _api_key_cache.pop(key_hash, None)
+
+async def revoke_cached_api_key(key_hash: str):
+    """Сбрасывает ключ из кеша этого процесса и публикует отзыв в Redis.
+
+    Остальные процессы проверяют отметку при попадании в кеш; она живет
+    API_KEY_CACHE_TTL секунд — дольше ни один процесс ключ не кеширует.
+    """
+    invalidate_api_key(key_hash)
+    try:
+        await redis_breaker.call(redis_manager.client.setex, _revoked_key(key_hash), settings.API_KEY_CACHE_TTL, 1)
+    except RedisError as e:
+        logger.warning({"event": "api_key_revoke_publish_failed", "error": repr(e)})
+
+def api_key_owner(key: str) -> Optional[str]:
+    """Владелец ключа, если ключ уже проверен и лежит в кеше; без запроса к БД."""
+    if not key.startswith(settings.API_KEY_PREFIX):
+        return None
+    cached = _api_key_cache.get(hash_api_key(key))
+    if cached and cached[0] > time.monotonic():
+        return cached[1].username
+    return None
+
+async def get_user_by_api_key(key: str, session: AsyncSession) -> Optional[Principal]:
+    if not key.startswith(settings.API_KEY_PREFIX):
+        return None
+    key_hash = hash_api_key(key)
+    now = time.monotonic()
+    cached = _api_key_cache.get(key_hash)
+    if cached and cached[0] > now:
+        try:
+            revoked = await redis_breaker.call(redis_manager.client.exists, _revoked_key(key_hash))
+        except RedisError:
+            # Без Redis отзыв в другом процессе виден не позднее API_KEY_CACHE_TTL
+            revoked = False
+        if not revoked:
+            return cached[1]
+        invalidate_api_key(key_hash)
+        return None
+
+    stmt = (
+        select(User)
+        .join(ApiKey, ApiKey.owner_id == User.id)
+        .where(ApiKey.key_hash == key_hash, ApiKey.revoked == False)  # noqa: E712
+    )
+    result = await session.execute(stmt)
+    user = result.scalar_one_or_none()
+    if user is None:
+        invalidate_api_key(key_hash)
+        return None
+
+    principal = Principal(id=user.id, username=user.username, role=user.role)
+    if len(_api_key_cache) >= settings.API_KEY_CACHE_SIZE:
+        _api_key_cache.pop(next(iter(_api_key_cache)))
+    _api_key_cache[key_hash] = (now + settings.API_KEY_CACHE_TTL, principal)
+    return principal
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -250,12 +430,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+async def get_current_user(
+    token: Optional[str] = Depends(oauth2_scheme),
+    api_key: Optional[str] = Depends(api_key_scheme),
+    db: AsyncSession = Depends(get_db)
+):
+    with timed("auth"):
+        return await _authenticate(token, api_key, db)
+
+async def _authenticate(token: Optional[str], api_key: Optional[str], db: AsyncSession) -> Union[User, Principal]:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if api_key:
+        user = await get_user_by_api_key(api_key, db)
+        if user is None:
+            raise credentials_exception
+        return user
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -268,6 +467,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
         raise credentials_exception
     return user
 
+def require_role(required_role: str):
+    async def role_checker(current_user: User = Depends(get_current_user)):
+        if current_user.role != required_role:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Operation not permitted",
+            )
+        return current_user
+    return role_checker
+
 def require_owner(current_user: User = Depends(get_current_user)):
     async def check_owner(note: Note):
         if note.owner_id != current_user.id:
@@ -1,14 +1,92 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from redis.exceptions import RedisError
+from sqlalchemy import lambda_stmt, update
 from sqlmodel import select
-from metadata import SessionDep
+from metadata import SessionDep, session_factory
 from models import Note, NoteCreate, NoteOut, NoteUpdate, User, get_current_user
 from config.redis_cache import redis_cache
+from config.autosave import AUTOSAVE_WRITES, autosave_buffer
+from config.rate_limit import rate_limit
+from config.deadline import request_timeout
+from config.timing import TimedRoute, TimedORJSONResponse
+from config.group_commit import GroupCommitWriter
+from config.settings import settings
 
 router = APIRouter(
+    route_class=TimedRoute,
     prefix="/notes",
     tags=["notes"]
 )
 
+
+# Горячие запросы собираются через lambda_stmt: SQLAlchemy кеширует
+# построенное выражение по коду лямбды, а значения из замыкания
+# подставляет как параметры, поэтому на каждый запрос не строится
+# и не компилируется новое дерево select
+#
+# Список читается колонками через Core: строки не превращаются в объекты
+# Note, не попадают в identity map и не валидируются повторно в NoteOut
+NOTE_TABLE = Note.__table__
+NOTE_COLUMNS = tuple(NOTE_TABLE.c[name] for name in NoteOut.model_fields)
+
+
+def notes_list_stmt(owner_id: int, skip: int, limit: int, search: str = None):
+    stmt = lambda_stmt(lambda: select(*NOTE_COLUMNS).where(NOTE_TABLE.c.owner_id == owner_id))
+    if search:
+        search_term = f"%{search}%"
+        stmt += lambda s: s.where(NOTE_TABLE.c.title.ilike(search_term) | NOTE_TABLE.c.content.ilike(search_term))
+    stmt += lambda s: s.offset(skip).limit(limit)
+    return stmt
+
+
+def owned_note_stmt(note_id: int, owner_id: int):
+    return lambda_stmt(lambda: select(Note).where(Note.id == note_id, Note.owner_id == owner_id))
+
+
+# Создание заметок при DB_GROUP_COMMIT_ENABLED: одна транзакция на пачку
+note_writer = GroupCommitWriter(session_factory, NOTE_TABLE, NOTE_COLUMNS)
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Версия из If-Match; None — условия нет (заголовок пуст или `*`)."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip().removeprefix("W/").strip('"')
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPException(status_code=412, detail="Note version mismatch")
+
+
+async def apply_update(session, note_id: int, owner_id: int, values: dict, expected: Optional[int] = None):
+    """Условный UPDATE без блокировок: версия проверяется и увеличивается
+    в одном запросе, из двух конкурентных записей проходит только первая."""
+    stmt = update(NOTE_TABLE).where(NOTE_TABLE.c.id == note_id, NOTE_TABLE.c.owner_id == owner_id)
+    if expected is not None:
+        stmt = stmt.where(NOTE_TABLE.c.version == expected)
+    stmt = stmt.values(**values, version=NOTE_TABLE.c.version + 1).returning(*NOTE_COLUMNS)
+    row = (await session.execute(stmt)).first()
+    if row is None:
+        await session.rollback()
+        result = await session.execute(owned_note_stmt(note_id, owner_id))
+        current = result.scalars().first()
+        if current is None:
+            raise HTTPException(status_code=404, detail="Note not found or access denied")
+        raise HTTPException(
+            status_code=412,
+            detail="Note version mismatch",
+            headers={"ETag": etag(current.version)}
+        )
+    await session.commit()
+    await redis_cache.invalidate("notes", owner_id)
+    return row
+
+
 @router.post(
     "/", 
     response_model=NoteOut,
@@ -34,7 +112,8 @@ router = APIRouter(
                         "id": 1,
                         "title": "Моя первая заметка",
                         "content": "Это содержимое моей первой заметки",
-                        "owner_id": 1
+                        "owner_id": 1,
+                        "version": 1
                     }
                 }
             }
@@ -65,12 +144,19 @@ router = APIRouter(
         }
     }
 )
-async def create_note(note: NoteCreate, session: SessionDep, current_user: User = Depends(get_current_user)):
+async def create_note(note: NoteCreate, response: Response, session: SessionDep, current_user: User = Depends(get_current_user)):
     """Создание новой заметки"""
+    if settings.DB_GROUP_COMMIT_ENABLED:
+        row = await note_writer.insert({"title": note.title, "content": note.content, "owner_id": current_user.id})
+        await redis_cache.invalidate("notes", current_user.id)
+        response.headers["ETag"] = etag(row.version)
+        return row._asdict()
     new_note = Note(title=note.title, content=note.content, owner_id=current_user.id)
     session.add(new_note)
     await session.commit()
     await session.refresh(new_note)
+    await redis_cache.invalidate("notes", current_user.id)
+    response.headers["ETag"] = etag(new_note.version)
     return new_note
 
 @router.get(
@@ -89,6 +175,14 @@ async def create_note(note: NoteCreate, session: SessionDep, current_user: User
     
     Кеширование:
     - Результаты кешируются на 60 секунд для улучшения производительности
+    - Создание, изменение и удаление заметки сбрасывают кеш владельца
+
+    Ограничение запросов:
+    - Отдельный лимит на пользователя, каждый запрос стоит 2 единицы
+
+    Дедлайн:
+    - 10 секунд, клиент может сократить заголовком X-Request-Timeout (секунды)
+    - Запрос отменяется вместе с SQL, если клиент отключился
     """,
     responses={
         200: {
@@ -100,13 +194,15 @@ async def create_note(note: NoteCreate, session: SessionDep, current_user: User
                             "id": 1,
                             "title": "Первая заметка",
                             "content": "Содержимое первой заметки",
-                            "owner_id": 1
+                            "owner_id": 1,
+                            "version": 1
                         },
                         {
                             "id": 2,
                             "title": "Вторая заметка", 
                             "content": "Содержимое второй заметки",
-                            "owner_id": 1
+                            "owner_id": 1,
+                            "version": 1
                         }
                     ]
                 }
@@ -119,10 +215,19 @@ async def create_note(note: NoteCreate, session: SessionDep, current_user: User
                     "example": {"detail": "Not authenticated"}
                 }
             }
+        },
+        504: {
+            "description": "Дедлайн запроса истек",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Request deadline exceeded"}
+                }
+            }
         }
     }
 )
-@redis_cache.cache(key_prefix="notes", ttl=60)
+@rate_limit(limit=120, window=60, cost=2, scope="notes:list")
+@request_timeout(10)
 async def list_notes(
     session: SessionDep, 
     current_user: User = Depends(get_current_user), 
@@ -131,17 +236,18 @@ async def list_notes(
     search: str = Query(None, description="Поиск по заголовку и содержимому")
     ):
     """Получение списка заметок с поиском и пагинацией"""
+    notes = await fetch_notes(session=session, owner_id=current_user.id, skip=skip, limit=limit, search=search)
+    # Черновики накладываются после кеша: список всегда видит последнее автосохранение
+    return TimedORJSONResponse(await autosave_buffer.overlay(notes))
 
-    stmt = select(Note).where(Note.owner_id == current_user.id)
-    if search:
-        search_term = f"%{search}%"
-        stmt = stmt.where(
-            (Note.title.ilike(search_term)) | (Note.content.ilike(search_term))
-        )
-    stmt = stmt.offset(skip).limit(limit)
-    result = await session.execute(stmt)
-    notes = result.scalars().all()
-    return notes
+
+# Каждая запись, меняющая заметки владельца, сбрасывает его поколение
+# кеша: список не отдает устаревшую версию, на которой If-Match получил бы 412
+@redis_cache.cache(key_prefix="notes", ttl=60, scope="owner_id")
+async def fetch_notes(session, owner_id: int, skip: int, limit: int, search: Optional[str]) -> list[dict]:
+    # Колонки таблицы без ORM-атрибутов: сессия выполняет запрос как Core
+    result = await session.execute(notes_list_stmt(owner_id, skip, limit, search))
+    return [row._asdict() for row in result]
 
 @router.get(
     "/{note_id}", 
@@ -166,7 +272,8 @@ async def list_notes(
                         "id": 1,
                         "title": "Моя заметка",
                         "content": "Содержимое заметки",
-                        "owner_id": 1
+                        "owner_id": 1,
+                        "version": 1
                     }
                 }
             }
@@ -189,14 +296,14 @@ async def list_notes(
         }
     }
 )
-async def get_note(note_id: int, session: SessionDep, current_user: User = Depends(get_current_user)):
+async def get_note(note_id: int, response: Response, session: SessionDep, current_user: User = Depends(get_current_user)):
     """Получение заметки по ID с проверкой владельца"""
-    stmt = select(Note).where(Note.id == note_id, Note.owner_id == current_user.id)
-    result = await session.execute(stmt)
+    result = await session.execute(owned_note_stmt(note_id, current_user.id))
     note = result.scalars().first()
     if not note:
         raise HTTPException(status_code=404, detail="Note not found or access denied")
-    return note
+    response.headers["ETag"] = etag(note.version)
+    return (await autosave_buffer.overlay([NoteOut.model_validate(note, from_attributes=True).model_dump()]))[0]
 
 @router.put(
     "/{note_id}", 
@@ -213,6 +320,11 @@ async def get_note(note_id: int, session: SessionDep, current_user: User = Depen
     Параметры:
     - note_id: ID заметки для обновления
     - Тело запроса: поля для обновления (все поля необязательные)
+    
+    Конкурентные изменения:
+    - Версия заметки приходит в заголовке ETag при чтении и изменении
+    - С заголовком If-Match изменение применяется, только если версия не
+      изменилась с момента чтения, иначе возвращается 412
     """,
     responses={
         200: {
@@ -223,11 +335,20 @@ async def get_note(note_id: int, session: SessionDep, current_user: User = Depen
                         "id": 1,
                         "title": "Обновленный заголовок",
                         "content": "Обновленное содержимое",
-                        "owner_id": 1
+                        "owner_id": 1,
+                        "version": 2
                     }
                 }
             }
         },
+        412: {
+            "description": "Заметка изменена с момента чтения",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Note version mismatch"}
+                }
+            }
+        },
         404: {
             "description": "Заметка не найдена или доступ запрещен",
             "content": {
@@ -262,21 +383,21 @@ async def get_note(note_id: int, session: SessionDep, current_user: User = Depen
         }
     }
 )
-async def update_note(note_id: int, note: NoteUpdate, session: SessionDep, current_user: User = Depends(get_current_user)):
-    """Обновление заметки с проверкой владельца"""
-    stmt = select(Note).where(Note.id == note_id, Note.owner_id == current_user.id)
-    result = await session.execute(stmt)
-    db_note = result.scalars().first()
-    if not db_note:
-        raise HTTPException(status_code=404, detail="Note not found or access denied")
-    if note.title is not None:
-        db_note.title = note.title
-    if note.content is not None:
-        db_note.content = note.content
-    session.add(db_note)
-    await session.commit()
-    await session.refresh(db_note)
-    return db_note
+async def update_note(
+    note_id: int,
+    note: NoteUpdate,
+    response: Response,
+    session: SessionDep,
+    current_user: User = Depends(get_current_user),
+    if_match: Optional[str] = Header(None, description="ETag заметки, полученный при чтении")
+):
+    """Обновление заметки с проверкой владельца и версии"""
+    expected = parse_if_match(if_match)
+    row = await apply_update(session, note_id, current_user.id, note.model_dump(exclude_none=True), expected)
+    # Явное изменение важнее несохраненного автосохранения
+    await autosave_buffer.discard(note_id)
+    response.headers["ETag"] = etag(row.version)
+    return row._asdict()
 
 @router.delete(
     "/{note_id}",
@@ -322,11 +443,84 @@ async def update_note(note_id: int, note: NoteUpdate, session: SessionDep, curre
 )
 async def delete_note(note_id: int, session: SessionDep, current_user: User = Depends(get_current_user)):
     """Удаление заметки с проверкой владельца"""
-    stmt = select(Note).where(Note.id == note_id, Note.owner_id == current_user.id)
-    result = await session.execute(stmt)
+    result = await session.execute(owned_note_stmt(note_id, current_user.id))
     note = result.scalars().first()
     if not note:
         raise HTTPException(status_code=404, detail="Note not found or access denied")
-    session.delete(note)
+    await session.delete(note)
     await session.commit()
-    return {"detail": "Note deleted"}
\ No newline at end of file
+    await redis_cache.invalidate("notes", current_user.id)
+    await autosave_buffer.discard(note_id)
+    return {"detail": "Note deleted"}
+
+
+@router.put(
+    "/{note_id}/autosave",
+    response_model=NoteOut,
+    status_code=202,
+    summary="Автосохранение заметки",
+    description="""
+    Сохраняет черновик заметки для частых автосохранений редактора.
+    
+    Особенности:
+    - Изменения копятся в Redis и записываются в БД пачками раз в несколько
+      секунд, поэтому частые автосохранения не создают по транзакции на каждое
+    - Чтение заметки и списка сразу возвращает сохраненный черновик
+    - Версия (ETag) увеличивается при записи черновика в БД
+    - Обычное изменение через PUT /notes/{id} отменяет несохраненный черновик
+    - Если Redis недоступен, изменение записывается в БД сразу
+    """,
+    responses={
+        202: {
+            "description": "Черновик сохранен",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "id": 1,
+                        "title": "Моя заметка",
+                        "content": "Черновик заметки",
+                        "owner_id": 1,
+                        "version": 1
+                    }
+                }
+            }
+        },
+        404: {
+            "description": "Заметка не найдена или доступ запрещен",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Note not found or access denied"}
+                }
+            }
+        },
+        401: {
+            "description": "Пользователь не аутентифицирован",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Not authenticated"}
+                }
+            }
+        }
+    }
+)
+async def autosave_note(note_id: int, note: NoteUpdate, session: SessionDep, current_user: User = Depends(get_current_user)):
+    """Автосохранение заметки через буфер"""
+    values = note.model_dump(exclude_none=True)
+    try:
+        buffered = await autosave_buffer.get(note_id)
+        if buffered is not None and buffered.get("owner_id") == str(current_user.id):
+            saved = await autosave_buffer.save(note_id, values)
+            if saved is not None:
+                return saved
+        # БД читается только без буфера (первое автосохранение или буфер
+        # только что записан в БД): проверить владельца и заполнить буфер
+        result = await session.execute(owned_note_stmt(note_id, current_user.id))
+        db_note = result.scalars().first()
+        if not db_note:
+            raise HTTPException(status_code=404, detail="Note not found or access denied")
+        base = NoteOut.model_validate(db_note, from_attributes=True).model_dump()
+        return await autosave_buffer.save(note_id, values, base)
+    except RedisError:
+        AUTOSAVE_WRITES.labels("direct").inc()
+        row = await apply_update(session, note_id, current_user.id, values)
+        return row._asdict()
@@ -0,0 +1,77 @@
+import asyncio
+import dataclasses
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlmodel import SQLModel
+from models import User, ApiKey, generate_api_key, hash_api_key, get_user_by_api_key, invalidate_api_key, revoke_cached_api_key, _api_key_cache
+from config.redis_client import redis_manager
+from config.settings import settings
+
+
+@pytest_asyncio.fixture
+async def session(monkeypatch):
+    monkeypatch.setattr(redis_manager, "_client", FakeAsyncRedis())
+    monkeypatch.setattr(redis_manager, "_loop", asyncio.get_running_loop())
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+def test_generated_key_is_prefixed_and_hash_is_stable():
+    key = generate_api_key()
+    assert key.startswith(settings.API_KEY_PREFIX)
+    assert hash_api_key(key) == hash_api_key(key)
+    assert hash_api_key(key) != hash_api_key(generate_api_key())
+
+
+@pytest.mark.asyncio
+async def test_api_key_lookup_is_cached(session):
+    user = User(username="batch", password="x" * 60, role="service")
+    session.add(user)
+    await session.commit()
+    key = generate_api_key()
+    session.add(ApiKey(name="job", prefix=key[:11], key_hash=hash_api_key(key), owner_id=user.id))
+    await session.commit()
+
+    queries = []
+    event.listen(session.bind.sync_engine, "before_cursor_execute", lambda *args: queries.append(args))
+
+    assert (await get_user_by_api_key(key, session)).id == user.id
+    assert (await get_user_by_api_key(key, session)).id == user.id
+    assert len(queries) == 1
+
+    invalidate_api_key(hash_api_key(key))
+    assert await get_user_by_api_key("nk_unknown", session) is None
+    assert await get_user_by_api_key("wrong-prefix", session) is None
+
+
+@pytest.mark.asyncio
+async def test_cached_principal_is_immutable_and_revocation_is_shared(session):
+    user = User(username="batch", password="x" * 60, role="service")
+    session.add(user)
+    await session.commit()
+    key = generate_api_key()
+    api_key = ApiKey(name="job", prefix=key[:11], key_hash=hash_api_key(key), owner_id=user.id)
+    session.add(api_key)
+    await session.commit()
+
+    principal = await get_user_by_api_key(key, session)
+    assert (principal.id, principal.username, principal.role) == (user.id, "batch", "service")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        principal.role = "admin"
+
+    # Другой процесс отозвал ключ: в БД и в Redis, но не в кеше этого процесса
+    api_key.revoked = True
+    await session.commit()
+    cached = _api_key_cache[api_key.key_hash]
+    await revoke_cached_api_key(api_key.key_hash)
+    _api_key_cache[api_key.key_hash] = cached
+
+    assert await get_user_by_api_key(key, session) is None
+    invalidate_api_key(api_key.key_hash)
@@ -0,0 +1,105 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from config.db_routing import PRIMARY_COOKIE, ReadRoutingMiddleware, replica_monitor, routing_session_class
+
+
+async def _engine(path, name):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE node (name TEXT)"))
+        await conn.execute(text("INSERT INTO node VALUES (:name)"), {"name": name})
+    return engine
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_until_client_writes(tmp_path, monkeypatch):
+    primary = await _engine(tmp_path / "primary.db", "primary")
+    replica = await _engine(tmp_path / "replica.db", "replica")
+    session_factory = async_sessionmaker(
+        bind=primary, sync_session_class=routing_session_class(primary, [replica])
+    )
+
+    app = FastAPI()
+    app.add_middleware(ReadRoutingMiddleware, pin_seconds=5)
+
+    @app.get("/node")
+    async def read_node():
+        async with session_factory() as session:
+            return (await session.execute(text("SELECT name FROM node"))).scalar_one()
+
+    @app.post("/node")
+    async def write_node():
+        async with session_factory() as session:
+            await session.execute(text("UPDATE node SET name = name"))
+            await session.commit()
+            return (await session.execute(text("SELECT name FROM node"))).scalar_one()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/node")).json() == "replica"
+
+        response = await client.post("/node")
+        assert response.json() == "primary"
+        assert PRIMARY_COOKIE in response.cookies
+        assert (await client.get("/node")).json() == "primary"
+
+        client.cookies.clear()
+        assert (await client.get("/node")).json() == "replica"
+
+        # Отставшая реплика исключается из чтения
+        monkeypatch.setitem(replica_monitor.lag, replica.sync_engine, replica_monitor.max_lag + 1)
+        assert (await client.get("/node")).json() == "primary"
+
+    await primary.dispose()
+    await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_replica_is_sticky_per_session_and_reads_do_not_pin(tmp_path):
+    primary = await _engine(tmp_path / "primary.db", "primary")
+    replicas = [await _engine(tmp_path / f"replica{i}.db", f"replica{i}") for i in range(4)]
+    session_factory = async_sessionmaker(
+        bind=primary, sync_session_class=routing_session_class(primary, replicas)
+    )
+
+    app = FastAPI()
+    app.add_middleware(ReadRoutingMiddleware, pin_seconds=5)
+
+    @app.get("/nodes")
+    async def read_nodes():
+        async with session_factory() as session:
+            return [(await session.execute(text("SELECT name FROM node"))).scalar_one() for _ in range(10)]
+
+    @app.post("/login")
+    async def login():
+        # Изменяющий метод без записи в БД
+        async with session_factory() as session:
+            await session.execute(text("SELECT name FROM node"))
+        return "ok"
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        names = (await client.get("/nodes")).json()
+        assert len(set(names)) == 1 and names[0].startswith("replica")
+
+        response = await client.post("/login")
+        assert response.status_code == 200
+        assert PRIMARY_COOKIE not in response.cookies
+
+    await primary.dispose()
+    for replica in replicas:
+        await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reads_outside_requests_use_primary(tmp_path):
+    primary = await _engine(tmp_path / "primary.db", "primary")
+    replica = await _engine(tmp_path / "replica.db", "replica")
+    session_factory = async_sessionmaker(
+        bind=primary, sync_session_class=routing_session_class(primary, [replica])
+    )
+    async with session_factory() as session:
+        assert (await session.execute(text("SELECT name FROM node"))).scalar_one() == "primary"
+    await primary.dispose()
+    await replica.dispose()
@@ -0,0 +1,107 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from config.deadline import DeadlineMiddleware, remaining, request_timeout
+
+
+def make_app(events: list):
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware)
+
+    @app.get("/slow")
+    @request_timeout(0.2)
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        return {"ok": True}
+
+    @app.get("/budget")
+    async def budget():
+        return {"remaining": remaining()}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_route_deadline_returns_504():
+    events = []
+    transport = httpx.ASGITransport(app=make_app(events))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/slow")
+        assert response.status_code == 504
+        assert events == ["cancelled"]
+
+        # Заголовок клиента может только сократить дедлайн
+        budget = (await client.get("/budget", headers={"X-Request-Timeout": "2"})).json()["remaining"]
+        assert 1 < budget <= 2
+        budget = (await client.get("/budget", headers={"X-Request-Timeout": "999"})).json()["remaining"]
+        assert 2 < budget <= 30
+        budget = (await client.get("/budget", headers={"X-Request-Timeout": "abc"})).json()["remaining"]
+        assert 2 < budget <= 30
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_request():
+    events = []
+    app = make_app(events)
+    sent = []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/slow", "raw_path": b"/slow", "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"test"), (b"x-request-timeout", b"5")], "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await asyncio.wait_for(app(scope, receive, send), 1)
+    assert events == ["cancelled"]
+    assert sent == []
+
+
+@pytest.mark.asyncio
+async def test_endpoint_timeout_error_is_not_a_deadline():
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware)
+
+    @app.get("/upstream")
+    async def upstream():
+        raise TimeoutError("upstream timed out")
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/upstream")
+
+    assert response.status_code == 500
+
+
+def test_statement_timeout_is_set_only_when_budget_is_short():
+    import time
+    from types import SimpleNamespace
+    from config.deadline import _apply_statement_timeout, _deadline
+    from config.settings import settings
+
+    statements = []
+    connection = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), exec_driver_sql=statements.append)
+    default = settings.DB_DEADLINE_TIMEOUT_THRESHOLD_MS / 1000
+
+    token = _deadline.set(time.monotonic() + default * 2)
+    _apply_statement_timeout(None, None, connection)
+    _deadline.reset(token)
+    assert statements == []
+
+    token = _deadline.set(time.monotonic() + default / 2)
+    _apply_statement_timeout(None, None, connection)
+    _deadline.reset(token)
+    assert len(statements) == 1 and statements[0].startswith("SET LOCAL statement_timeout = ")
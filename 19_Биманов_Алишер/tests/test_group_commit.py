@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from config.group_commit import GroupCommitWriter
+from notes import NOTE_COLUMNS, NOTE_TABLE
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'group.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_inserts_share_batches(session_factory, monkeypatch):
+    writer = GroupCommitWriter(session_factory, NOTE_TABLE, NOTE_COLUMNS, max_delay=0.01, max_rows=4)
+    batches = []
+    write = writer._write
+
+    async def record(batch):
+        batches.append(len(batch))
+        await write(batch)
+
+    monkeypatch.setattr(writer, "_write", record)
+    rows = await asyncio.gather(*(
+        writer.insert({"title": f"note {i}", "content": "x", "owner_id": 1}) for i in range(10)
+    ))
+
+    assert batches == [4, 4, 2]
+    assert [row.title for row in rows] == [f"note {i}" for i in range(10)]
+    assert len({row.id for row in rows}) == 10
+    assert all(row.version == 1 for row in rows)
+
+
+@pytest.mark.asyncio
+async def test_failed_row_only_fails_its_request(session_factory):
+    writer = GroupCommitWriter(session_factory, NOTE_TABLE, NOTE_COLUMNS, max_delay=0.01, max_rows=10)
+    results = await asyncio.gather(
+        writer.insert({"title": "ok", "content": "a", "owner_id": 1}),
+        writer.insert({"title": None, "content": "b", "owner_id": 1}),
+        writer.insert({"title": "ok too", "content": "c", "owner_id": 1}),
+        return_exceptions=True
+    )
+
+    assert isinstance(results[1], IntegrityError)
+    assert [results[0].title, results[2].title] == ["ok", "ok too"]
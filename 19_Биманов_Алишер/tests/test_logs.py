@@ -0,0 +1,71 @@
+import io
+import logging
+import time
+import httpx
+import orjson
+import pytest
+from fastapi import FastAPI, HTTPException
+from config.logs import setup_logging, stop_logging
+from config.middleware import RequestLoggingMiddleware
+
+
+class SlowStream(io.StringIO):
+    """Поток вывода, который тормозит, как перегруженный лог-драйвер."""
+
+    def write(self, s):
+        time.sleep(0.005)
+        return super().write(s)
+
+
+@pytest.fixture
+def log_stream():
+    stream = SlowStream()
+    setup_logging(stream)
+    yield stream
+    setup_logging()
+
+
+def read_lines(stream) -> list[dict]:
+    stop_logging()
+    return [orjson.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_logging_does_not_wait_for_slow_stream(log_stream):
+    logger = logging.getLogger("test")
+
+    start = time.perf_counter()
+    for i in range(100):
+        logger.info({"event": "test", "i": i})
+    elapsed = time.perf_counter() - start
+
+    # 100 записей в медленный поток заняли бы >= 0.5 с
+    assert elapsed < 0.05
+    lines = read_lines(log_stream)
+    assert [line["i"] for line in lines] == list(range(100))
+    assert lines[0]["level"] == "INFO"
+
+
+@pytest.mark.asyncio
+async def test_access_log_single_line_with_sampling(log_stream):
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware, sample_rate=0.0)
+
+    @app.get("/ok")
+    def ok():
+        return {}
+
+    @app.get("/missing")
+    def missing():
+        raise HTTPException(status_code=404)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        for _ in range(10):
+            await client.get("/ok")
+        await client.get("/missing?x=1")
+
+    access = [line for line in read_lines(log_stream) if line.get("event") == "access"]
+    assert len(access) == 1
+    assert access[0]["path"] == "/missing"
+    assert access[0]["query"] == "x=1"
+    assert access[0]["status_code"] == 404
+    assert access[0]["duration_ms"] > 0
@@ -0,0 +1,35 @@
+import asyncio
+import io
+import time
+import orjson
+import pytest
+from config.logs import setup_logging, stop_logging
+from config.loop_monitor import LOOP_BLOCKED, LOOP_LAG, LoopLagMonitor
+
+
+def blocking_call():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_monitor_measures_lag_and_captures_blocking_stack():
+    stream = io.StringIO()
+    setup_logging(stream)
+    monitor = LoopLagMonitor(interval=0.02, threshold=0.1)
+    lag_before = LOOP_LAG._sum.get()
+    blocked_before = LOOP_BLOCKED._value.get()
+
+    await monitor.start()
+    await asyncio.sleep(0.1)
+    blocking_call()
+    await asyncio.sleep(0.1)
+    await monitor.stop()
+    stop_logging()
+    setup_logging()
+
+    assert LOOP_LAG._sum.get() - lag_before >= 0.25
+    assert LOOP_BLOCKED._value.get() == blocked_before + 1
+    events = [orjson.loads(line) for line in stream.getvalue().splitlines()]
+    blocked = [event for event in events if event.get("event") == "loop_blocked"]
+    assert len(blocked) == 1
+    assert "blocking_call" in blocked[0]["stack"]
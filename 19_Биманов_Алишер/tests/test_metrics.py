@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+WORKER = textwrap.dedent("""
+    import sys
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from config.metrics import setup_metrics
+
+    app = FastAPI()
+
+    @app.get("/notes/{note_id}")
+    def note(note_id: int):
+        return {}
+
+    @app.get("/health")
+    def health():
+        return {}
+
+    setup_metrics(app)
+    client = TestClient(app)
+    for note_id in range(int(sys.argv[1])):
+        client.get(f"/notes/{note_id}")
+    client.get("/health")
+    client.get("/unknown/path")
+    if sys.argv[2] == "scrape":
+        print(client.get("/metrics").text)
+""")
+
+
+def run_worker(env, requests: int, action: str) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", WORKER, str(requests), action],
+        env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    return result.stdout
+
+
+def test_metrics_aggregate_across_processes(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+
+    run_worker(env, 3, "exit")
+    output = run_worker(env, 2, "scrape")
+
+    totals = [
+        line for line in output.splitlines()
+        if line.startswith("http_requests_total{") and 'handler="/notes/{note_id}"' in line
+    ]
+    assert len(totals) == 1 and totals[0].endswith(" 5.0")
+    assert 'handler="/health"' not in output
+    assert 'handler="/unknown/path"' not in output
+    assert 'le="0.005"' in output
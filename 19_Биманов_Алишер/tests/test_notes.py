@@ -0,0 +1,218 @@
+import asyncio
+import httpx
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from config.autosave import autosave_buffer
+from config.database import LazySession
+from config.redis_cache import redis_cache
+from config.redis_client import redis_manager
+from metadata import get_db
+from models import User, get_current_user
+from notes import router
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'notes.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_factory() as session:
+        user = User(username="alice", password="x" * 60)
+        session.add(user)
+        await session.commit()
+
+    async def get_db_override():
+        session = LazySession(session_factory)
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    monkeypatch.setattr(redis_manager, "_client", FakeAsyncRedis())
+    monkeypatch.setattr(redis_manager, "_loop", asyncio.get_running_loop())
+    monkeypatch.setattr(redis_cache, "redis", redis_manager._client)
+    monkeypatch.setattr(autosave_buffer, "session_factory", session_factory)
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = get_db_override
+    app.dependency_overrides[get_current_user] = lambda: user
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_update_with_stale_if_match_is_rejected(client):
+    created = await client.post("/notes/", json={"title": "draft", "content": "v1"})
+    note_id, etag = created.json()["id"], created.headers["ETag"]
+    assert etag == '"1"'
+
+    first = await client.put(f"/notes/{note_id}", json={"content": "phone"}, headers={"If-Match": etag})
+    assert first.status_code == 200
+    assert first.json()["version"] == 2
+    assert first.headers["ETag"] == '"2"'
+
+    # Второе устройство пишет поверх устаревшей версии
+    second = await client.put(f"/notes/{note_id}", json={"content": "laptop"}, headers={"If-Match": etag})
+    assert second.status_code == 412
+    assert second.headers["ETag"] == '"2"'
+
+    note = await client.get(f"/notes/{note_id}")
+    assert note.json()["content"] == "phone"
+    assert note.headers["ETag"] == '"2"'
+
+
+@pytest.mark.asyncio
+async def test_update_without_if_match_and_missing_note(client):
+    created = await client.post("/notes/", json={"title": "draft", "content": "v1"})
+    note_id = created.json()["id"]
+
+    updated = await client.put(f"/notes/{note_id}", json={"title": "final"})
+    assert updated.json() == {"id": note_id, "title": "final", "content": "v1", "owner_id": 1, "version": 2}
+
+    missing = await client.put("/notes/999", json={"title": "final"}, headers={"If-Match": '"1"'})
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_list_cache_follows_writes(client):
+    created = await client.post("/notes/", json={"title": "draft", "content": "v1"})
+    note_id = created.json()["id"]
+    assert (await client.get("/notes/")).json()[0]["version"] == 1
+
+    await client.put(f"/notes/{note_id}", json={"content": "phone"}, headers={"If-Match": '"1"'})
+    listed = (await client.get("/notes/")).json()[0]
+    assert (listed["content"], listed["version"]) == ("phone", 2)
+
+    # Версия из списка подходит для следующего условного обновления
+    updated = await client.put(
+        f"/notes/{note_id}", json={"content": "laptop"}, headers={"If-Match": f'"{listed["version"]}"'}
+    )
+    assert updated.status_code == 200
+
+    await client.post("/notes/", json={"title": "second", "content": "c"})
+    assert len((await client.get("/notes/")).json()) == 2
+    await client.delete(f"/notes/{note_id}")
+    assert [note["title"] for note in (await client.get("/notes/")).json()] == ["second"]
+
+
+@pytest.mark.asyncio
+async def test_autosave_is_buffered_and_flushed_in_one_write(client):
+    created = await client.post("/notes/", json={"title": "draft", "content": "v0"})
+    note_id = created.json()["id"]
+    # Список попадает в кеш ответов до автосохранений
+    assert (await client.get("/notes/")).json()[0]["content"] == "v0"
+
+    for i in range(1, 6):
+        saved = await client.put(f"/notes/{note_id}/autosave", json={"content": f"v{i}"})
+        assert saved.status_code == 202
+    assert saved.json()["content"] == "v5"
+
+    # Чтение видит черновик, в БД он еще не записан
+    note = await client.get(f"/notes/{note_id}")
+    assert note.json()["content"] == "v5"
+    assert note.headers["ETag"] == '"1"'
+    assert (await client.get("/notes/")).json()[0]["content"] == "v5"
+    assert await autosave_buffer.flush() == 0
+
+    assert await autosave_buffer.flush(force=True) == 1
+    assert await autosave_buffer.get(note_id) is None
+    note = await client.get(f"/notes/{note_id}")
+    assert note.json()["content"] == "v5"
+    assert note.headers["ETag"] == '"2"'
+    # Буфер удален, а список из кеша не возвращается к содержимому до автосохранений
+    listed = (await client.get("/notes/")).json()[0]
+    assert (listed["content"], listed["version"]) == ("v5", 2)
+
+
+@pytest.mark.asyncio
+async def test_explicit_update_discards_autosave(client):
+    created = await client.post("/notes/", json={"title": "draft", "content": "v0"})
+    note_id = created.json()["id"]
+
+    await client.put(f"/notes/{note_id}/autosave", json={"content": "draft"})
+    await client.put(f"/notes/{note_id}", json={"content": "final"}, headers={"If-Match": '"1"'})
+
+    assert await autosave_buffer.flush(force=True) == 0
+    assert (await client.get(f"/notes/{note_id}")).json()["content"] == "final"
+    assert (await client.put("/notes/999/autosave", json={"content": "x"})).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_create_with_group_commit(client, monkeypatch):
+    import notes
+    monkeypatch.setattr(notes.settings, "DB_GROUP_COMMIT_ENABLED", True)
+    monkeypatch.setattr(notes.note_writer, "session_factory", autosave_buffer.session_factory)
+
+    created = await asyncio.gather(*(client.post("/notes/", json={"title": f"n{i}", "content": "c"}) for i in range(3)))
+    assert [r.status_code for r in created] == [201] * 3
+    assert [r.json()["title"] for r in created] == ["n0", "n1", "n2"]
+    assert created[0].headers["ETag"] == '"1"'
+    assert len((await client.get("/notes/")).json()) == 3
+
+
+@pytest.mark.asyncio
+async def test_autosave_survives_flush_race_and_malformed_buffers(client):
+    first = (await client.post("/notes/", json={"title": "a", "content": "v0"})).json()["id"]
+    second = (await client.post("/notes/", json={"title": "b", "content": "v0"})).json()["id"]
+
+    # Буфер сброшен в БД между чтением и записью: без base он не создается
+    assert await autosave_buffer.save(first, {"content": "lost"}) is None
+    assert await autosave_buffer.get(first) is None
+    saved = await client.put(f"/notes/{first}/autosave", json={"content": "v1"})
+    assert saved.json()["title"] == "a"
+
+    # Неполный буфер (например, от прежней версии) не блокирует сброс остальных
+    redis = redis_manager._client
+    await redis.hset(f"autosave:note:{second}", mapping={"content": "broken", "rev": 1})
+    await redis.zadd("autosave:dirty", {second: 0})
+    assert await autosave_buffer.flush(force=True) == 1
+    assert await autosave_buffer.get(second) is None
+    assert (await client.get(f"/notes/{first}")).json()["content"] == "v1"
+    assert (await client.get(f"/notes/{second}")).json()["content"] == "v0"
+
+
+@pytest.mark.asyncio
+async def test_flush_does_not_overwrite_concurrent_update(client):
+    note_id = (await client.post("/notes/", json={"title": "draft", "content": "v0"})).json()["id"]
+    await client.put(f"/notes/{note_id}/autosave", json={"content": "draft"})
+
+    # Явное изменение закоммичено, а буфер еще не сброшен (discard не успел)
+    async with autosave_buffer.session_factory() as session:
+        await session.execute(text("UPDATE note SET content = 'explicit', version = version + 1 WHERE id = :id"), {"id": note_id})
+        await session.commit()
+
+    assert await autosave_buffer.flush(force=True) == 0
+    assert await autosave_buffer.get(note_id) is None
+    note = await client.get(f"/notes/{note_id}")
+    assert note.json()["content"] == "explicit"
+    assert note.headers["ETag"] == '"2"'
+
+
+@pytest.mark.asyncio
+async def test_buffer_changed_during_flush_is_rebased(client, monkeypatch):
+    note_id = (await client.post("/notes/", json={"title": "draft", "content": "v0"})).json()["id"]
+    await client.put(f"/notes/{note_id}/autosave", json={"content": "v1"})
+    write = autosave_buffer._write
+
+    async def write_while_typing(buffers):
+        written = await write(buffers)
+        await client.put(f"/notes/{note_id}/autosave", json={"content": "v2"})
+        return written
+
+    monkeypatch.setattr(autosave_buffer, "_write", write_while_typing)
+    assert await autosave_buffer.flush(force=True) == 1
+    assert (await autosave_buffer.get(note_id))["version"] == "2"
+
+    monkeypatch.setattr(autosave_buffer, "_write", write)
+    assert await autosave_buffer.flush(force=True) == 1
+    note = await client.get(f"/notes/{note_id}")
+    assert note.json()["content"] == "v2"
+    assert note.headers["ETag"] == '"3"'
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import httpx
+import pytest
+from fastapi import FastAPI
+from config.profiler import RequestProfilingMiddleware, SamplingProfiler
+from debug import router as debug_router
+from models import User, get_current_user
+
+
+def busy_work(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def make_app(role: str) -> FastAPI:
+    app = FastAPI()
+    app.include_router(debug_router)
+    app.add_middleware(RequestProfilingMiddleware, enabled=True, secret="s3cret")
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, username="root", password="x", role=role)
+
+    @app.get("/slow")
+    async def slow():
+        busy_work(0.1)
+        return {}
+
+    @app.get("/wait")
+    async def wait():
+        await asyncio.sleep(0.05)
+        return {}
+
+    return app
+
+
+def test_sampling_profiler_collapsed_and_speedscope():
+    profiler = SamplingProfiler(interval=0.001).start()
+    busy_work(0.1)
+    profiler.stop()
+
+    collapsed = profiler.collapsed()
+    assert "busy_work (test_profiler.py" in collapsed
+    stack, count = collapsed.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 10
+
+    speedscope = profiler.speedscope("test")
+    frames = speedscope["shared"]["frames"]
+    profile = speedscope["profiles"][0]
+    assert len(profile["samples"]) == len(profile["weights"])
+    assert all(index < len(frames) for sample in profile["samples"] for index in sample)
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint_samples_event_loop():
+    app = make_app("admin")
+
+    async def hog():
+        await asyncio.sleep(0.02)
+        busy_work(0.1)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        task = asyncio.create_task(hog())
+        response = await client.get("/debug/profile", params={"seconds": 0.3, "format": "speedscope"})
+        await task
+
+    assert response.status_code == 200
+    names = [frame["name"] for frame in response.json()["shared"]["frames"]]
+    assert any(name.startswith("busy_work") for name in names)
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint_requires_admin():
+    app = make_app("user")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/debug/profile", params={"seconds": 0.1})
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_request_profile_header():
+    app = make_app("admin")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        plain = await client.get("/slow")
+        guessed = await client.get("/slow", headers={"X-Profile": "1"})
+        profiled = await client.get("/slow", headers={"X-Profile": "s3cret"})
+        profile = await client.get(f"/debug/profiles/{profiled.headers['X-Profile-Id']}")
+
+    assert "X-Profile-Id" not in plain.headers
+    assert "X-Profile-Id" not in guessed.headers
+    assert profile.status_code == 200
+    assert "busy_work" in profile.text
+
+
+@pytest.mark.asyncio
+async def test_request_profiles_do_not_overlap():
+    app = make_app("admin")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(*(client.get("/wait", headers={"X-Profile": "s3cret"}) for _ in range(3)))
+
+    assert [response.status_code for response in responses] == [200] * 3
+    assert sum("X-Profile-Id" in response.headers for response in responses) == 1
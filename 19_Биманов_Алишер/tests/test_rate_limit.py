@@ -0,0 +1,238 @@
+import asyncio
+import time
+import httpx
+import pytest
+from fakeredis import FakeAsyncRedis, FakeServer
+from fastapi import FastAPI
+from config.middleware import RateLimiterMiddleware
+from config.rate_limit import RedisRateLimiter, HybridRateLimiter, rate_limit
+from models import Principal, _api_key_cache, create_access_token, hash_api_key
+
+
+@pytest.mark.asyncio
+async def test_gcra_allows_limit_then_rejects():
+    limiter = RedisRateLimiter(FakeAsyncRedis())
+
+    results = [await limiter.hit("1.2.3.4", limit=3, window=60) for _ in range(4)]
+
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    assert results[3].headers()["Retry-After"] == "20"
+
+
+@pytest.mark.asyncio
+async def test_gcra_cost_consumes_several_tokens():
+    limiter = RedisRateLimiter(FakeAsyncRedis())
+
+    assert (await limiter.hit("k", limit=10, window=60, cost=8)).remaining == 2
+    assert not (await limiter.hit("k", limit=10, window=60, cost=3)).allowed
+    assert (await limiter.hit("k", limit=10, window=60, cost=2)).allowed
+
+
+@pytest.mark.asyncio
+async def test_gcra_is_atomic_under_concurrency():
+    limiter = RedisRateLimiter(FakeAsyncRedis())
+
+    results = await asyncio.gather(*(limiter.hit("burst", limit=5, window=60) for _ in range(50)))
+
+    assert sum(r.allowed for r in results) == 5
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+async def measure_hybrid_drift(workers: int, limit: int, window: int, demand: float,
+                               sync_interval: float = 0.1, duration: float = 60.0) -> float:
+    """Прогоняет `workers` воркеров с общим Redis и возвращает относительное
+    отклонение пропущенных запросов от лимита (0.05 = на 5% больше)."""
+    server = FakeServer()
+    clock = FakeClock()
+    limiters = [
+        HybridRateLimiter(FakeAsyncRedis(server=server), sync_interval=3600, clock=clock)
+        for _ in range(workers)
+    ]
+    step = 0.01
+    per_step = demand * step / workers
+    credit = [0.0] * workers
+    allowed = 0
+    next_sync = sync_interval
+    elapsed = 0.0
+    while elapsed < duration:
+        for i, limiter in enumerate(limiters):
+            credit[i] += per_step
+            while credit[i] >= 1:
+                credit[i] -= 1
+                allowed += (await limiter.hit("client", limit, window)).allowed
+        elapsed += step
+        clock.now += step
+        if elapsed >= next_sync:
+            next_sync += sync_interval
+            for limiter in limiters:
+                await limiter.sync()
+    for limiter in limiters:
+        await limiter.close()
+
+    expected = limit + limit / window * duration
+    return allowed / expected - 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("workers, demand, sync_interval", [
+    (1, 50, 0.1),
+    (4, 50, 0.1),
+    (4, 200, 0.1),
+    (8, 200, 0.05),
+    (8, 200, 0.5),
+])
+async def test_hybrid_limiter_drift(workers, demand, sync_interval):
+    drift = await measure_hybrid_drift(workers, limit=100, window=10, demand=demand, sync_interval=sync_interval)
+    assert abs(drift) < 0.1
+
+
+def make_app(limiter):
+    app = FastAPI()
+    app.add_middleware(RateLimiterMiddleware, limiter=limiter)
+
+    @app.get("/health")
+    def health():
+        return {}
+
+    @app.get("/cheap")
+    def cheap():
+        return {}
+
+    @app.get("/search")
+    @rate_limit(limit=4, window=60, cost=2, scope="search")
+    def search():
+        return {}
+
+    return app
+
+
+def bearer(username: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+
+@pytest.mark.asyncio
+async def test_policy_cost_and_scopes_are_independent():
+    app = make_app(RedisRateLimiter(FakeAsyncRedis()))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        statuses = [(await client.get("/search")).status_code for _ in range(3)]
+        cheap = await client.get("/cheap")
+        health = await client.get("/health")
+
+    assert statuses == [200, 200, 429]
+    assert cheap.status_code == 200
+    assert "RateLimit-Limit" not in health.headers
+
+
+@pytest.mark.asyncio
+async def test_policy_keys_by_user_behind_shared_ip():
+    app = make_app(RedisRateLimiter(FakeAsyncRedis()))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        alice = [(await client.get("/search", headers=bearer("alice"))).status_code for _ in range(3)]
+        bob = await client.get("/search", headers=bearer("bob"))
+        forged = await client.get("/search", headers={"Authorization": "Bearer forged"})
+
+    assert alice == [200, 200, 429]
+    assert bob.status_code == 200
+    assert forged.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_unverified_api_keys_share_the_ip_limit(monkeypatch):
+    app = make_app(RedisRateLimiter(FakeAsyncRedis()))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        statuses = [
+            (await client.get("/search", headers={"X-API-Key": f"nk_random{i}"})).status_code
+            for i in range(3)
+        ]
+        # Проверенный ключ получает bucket своего владельца
+        monkeypatch.setitem(_api_key_cache, hash_api_key("nk_service"), (time.monotonic() + 60, Principal(id=2, username="svc", role="service")))
+        service = await client.get("/search", headers={"X-API-Key": "nk_service"})
+
+    assert statuses == [200, 200, 429]
+    assert service.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_limiter_errors_fail_open():
+    class BrokenLimiter:
+        async def hit(self, *args, **kwargs):
+            raise ValueError("bad reply")
+
+    sent = []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/search", "raw_path": b"/search", "root_path": "", "query_string": b"",
+        "headers": [], "client": None, "server": ("test", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    # Без адреса клиента (unix-сокет) ключ все равно строится
+    await make_app(RedisRateLimiter(FakeAsyncRedis()))(scope, receive, send)
+    assert sent[0]["status"] == 200
+    sent.clear()
+    await make_app(BrokenLimiter())(scope, receive, send)
+    assert sent[0]["status"] == 200
+
+
+@pytest.mark.asyncio
+async def test_hybrid_sync_task_does_not_inherit_request_context(monkeypatch):
+    from config.timing import RequestTimer, _timer
+    limiter = HybridRateLimiter(FakeAsyncRedis(), sync_interval=0.01)
+    seen = []
+
+    async def sync():
+        seen.append(_timer.get())
+
+    monkeypatch.setattr(limiter, "sync", sync)
+    token = _timer.set(RequestTimer("middleware"))
+    try:
+        await limiter.hit("user:alice", 10, 60)
+    finally:
+        _timer.reset(token)
+    await asyncio.sleep(0.05)
+    await limiter.close()
+
+    assert seen and all(timer is None for timer in seen)
+
+
+@pytest.mark.asyncio
+async def test_hybrid_sync_survives_errors_and_close_flushes(monkeypatch):
+    from config.rate_limit import close_limiters
+    redis = FakeAsyncRedis()
+    limiter = HybridRateLimiter(redis, sync_interval=0.01)
+    sync = limiter.sync
+    failures = []
+
+    async def flaky_sync():
+        if len(failures) < 2:
+            failures.append(1)
+            raise ValueError("bad reply")
+        await sync()
+
+    monkeypatch.setattr(limiter, "sync", flaky_sync)
+    await limiter.hit("user:alice", 10, 60)
+    await asyncio.sleep(0.1)
+    assert len(failures) == 2 and not limiter._task.done()
+
+    # Токены, израсходованные после последней синхронизации, уходят в Redis при закрытии
+    monkeypatch.setattr(limiter, "sync_interval", 3600)
+    await asyncio.sleep(0.02)
+    await limiter.hit("user:alice", 10, 60, cost=3)
+    task = limiter._task
+    await close_limiters()
+    assert task.cancelled() and limiter._task is None
+    slot = [key async for key in redis.scan_iter("rate_limit:hybrid:user:alice:*")]
+    assert int(await redis.get(slot[0])) == 4
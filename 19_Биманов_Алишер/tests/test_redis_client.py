@@ -0,0 +1,49 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from config.redis_client import RedisManager, REDIS_POOL_WAIT
+from config.settings import settings
+
+
+@pytest_asyncio.fixture
+async def pong_server():
+    """Минимальный Redis: отвечает на PING с задержкой, на остальное — OK."""
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        while header := await reader.readline():
+            # Команда в RESP: *<argc>, затем пары $<len> / <значение>
+            args = [(await reader.readline(), await reader.readline())[1].strip() for _ in range(int(header[1:]))]
+            if args[0].upper() == b"PING":
+                await asyncio.sleep(0.01)
+                writer.write(b"+PONG\r\n")
+            else:
+                writer.write(b"+OK\r\n")
+            await writer.drain()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    yield f"redis://127.0.0.1:{port}/0", connections
+    for writer in connections:
+        writer.close()
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_shared_pool_caps_connections(pong_server, monkeypatch):
+    url, connections = pong_server
+    monkeypatch.setattr(settings, "REDIS_POOL_SIZE", 3)
+    manager = RedisManager()
+    client = manager.connect(url)
+    waits_before = REDIS_POOL_WAIT._sum.get()
+
+    replies = await asyncio.gather(*(manager.client.ping() for _ in range(30)))
+
+    assert all(replies)
+    assert manager.client is client
+    assert len(connections) == 3
+    # Запросам сверх размера пула пришлось ждать освободившееся соединение
+    assert REDIS_POOL_WAIT._sum.get() - waits_before > 0.05
+    await manager.close()
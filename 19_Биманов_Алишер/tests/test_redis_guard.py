@@ -0,0 +1,136 @@
+import asyncio
+import time
+import httpx
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from fastapi import FastAPI
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from config.middleware import RateLimiterMiddleware
+from config.rate_limit import RedisRateLimiter
+from config.redis_cache import RedisCache
+from config.redis_guard import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest_asyncio.fixture
+async def slow_redis():
+    """Redis, который принимает соединение, но никогда не отвечает."""
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        await reader.read(-1)
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    client = Redis(host="127.0.0.1", port=port)
+    yield client
+    await client.aclose()
+    for writer in connections:
+        writer.close()
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_timeouts_and_bypasses_fast(slow_redis):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=60, call_timeout=0.05)
+
+    for _ in range(3):
+        with pytest.raises(RedisError):
+            await breaker.call(slow_redis.get, "key")
+    assert breaker.state == OPEN
+
+    start = time.perf_counter()
+    for _ in range(100):
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(slow_redis.get, "key")
+    assert time.perf_counter() - start < 0.05
+
+
+@pytest.mark.asyncio
+async def test_breaker_half_open_probe_closes_or_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=5, clock=clock)
+    redis = FakeAsyncRedis()
+
+    async def fail():
+        raise ConnectionError("refused")
+
+    with pytest.raises(RedisError):
+        await breaker.call(fail)
+    assert breaker.state == OPEN
+
+    clock.now += 5
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(RedisError):
+        await breaker.call(fail)
+    assert breaker.state == OPEN
+
+    clock.now += 5
+    await breaker.call(redis.set, "key", "1")
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_cache_and_limiter_fail_open_on_slow_redis(slow_redis):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60, call_timeout=0.05)
+    cache = RedisCache(breaker)
+    cache.redis = slow_redis
+
+    @cache.cache(key_prefix="t", ttl=60)
+    async def compute(x: int):
+        return x * 2
+
+    app = FastAPI()
+    app.add_middleware(RateLimiterMiddleware, limiter=RedisRateLimiter(slow_redis, breaker=breaker))
+
+    @app.get("/ping")
+    async def ping():
+        return {"value": await compute(x=21)}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        # Первый запрос ждет таймауты лимитера и кеша, после чего circuit открыт
+        assert (await client.get("/ping")).json() == {"value": 42}
+        assert breaker.state == OPEN
+
+        start = time.perf_counter()
+        for _ in range(20):
+            response = await client.get("/ping")
+            assert response.status_code == 200
+        assert (time.perf_counter() - start) / 20 < 0.02
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidate_bumps_generation_of_scope():
+    cache = RedisCache(CircuitBreaker("test", failure_threshold=3, reset_timeout=60, call_timeout=0.05))
+    cache.redis = FakeAsyncRedis()
+    calls = []
+
+    @cache.cache(key_prefix="t", ttl=60, scope="owner_id")
+    async def compute(owner_id: int):
+        calls.append(owner_id)
+        return len(calls)
+
+    assert await compute(owner_id=1) == 1
+    assert await compute(owner_id=2) == 2
+    assert await compute(owner_id=1) == 1
+
+    # Инвалидация владельца 1 не трогает записи владельца 2
+    await cache.invalidate("t", 1)
+    assert await compute(owner_id=1) == 3
+    assert await compute(owner_id=2) == 2
+
+    # Инвалидация префикса делает устаревшими все записи
+    await cache.invalidate("t")
+    assert await compute(owner_id=2) == 4
+    assert not [key async for key in cache.redis.scan_iter("t:generation*") if await cache.redis.ttl(key) < 0]
@@ -0,0 +1,54 @@
+import io
+import httpx
+import orjson
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from config.logs import setup_logging, stop_logging
+from config.settings import settings
+from config.sql_profiler import DB_N_PLUS_ONE, SQLProfilerMiddleware, current_stats, profile_engine, redact
+
+
+def test_redact_hides_values():
+    assert redact(("alice", 42)) == ["str", "int"]
+    assert redact({"username": "alice"}) == {"username": "str"}
+    assert redact([("a", 1), ("b", 2)]) == [["str", "int"], ["str", "int"]]
+
+
+@pytest.mark.asyncio
+async def test_profiler_counts_queries_and_flags_n_plus_one(monkeypatch):
+    stream = io.StringIO()
+    setup_logging(stream)
+    monkeypatch.setattr(settings, "SQL_SLOW_QUERY_MS", 0)
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    profile_engine(engine.sync_engine)
+    seen = {}
+
+    app = FastAPI()
+    app.add_middleware(SQLProfilerMiddleware, n_plus_one_threshold=3)
+
+    @app.get("/notes")
+    async def notes():
+        async with engine.connect() as conn:
+            for note_id in range(5):
+                await conn.execute(text("SELECT :id"), {"id": note_id})
+        stats = current_stats()
+        seen["count"], seen["duration"] = stats.count, stats.duration
+        return {}
+
+    before = DB_N_PLUS_ONE.labels("/notes")._value.get()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/notes")
+    await engine.dispose()
+    stop_logging()
+    setup_logging()
+
+    assert seen["count"] == 5
+    assert seen["duration"] > 0
+    assert DB_N_PLUS_ONE.labels("/notes")._value.get() == before + 1
+    lines = [orjson.loads(line) for line in stream.getvalue().splitlines()]
+    slow = [line for line in lines if line.get("event") == "slow_query"]
+    assert slow and all(line["parameters"] == ["int"] for line in slow)
+    n_plus_one = [line for line in lines if line.get("event") == "n_plus_one"]
+    assert n_plus_one[0]["repeated"] == [{"statement": "SELECT ?", "count": 5}]
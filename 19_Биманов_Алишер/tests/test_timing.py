@@ -0,0 +1,62 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from config.timing import COMPONENT_SECONDS, TimedJSONResponse, TimedRoute, TimingMiddleware, instrument_engine, timed
+
+
+def parse_server_timing(value: str) -> dict[str, float]:
+    metrics = {}
+    for item in value.split(", "):
+        name, duration = item.split(";dur=")
+        metrics[name] = float(duration)
+    return metrics
+
+
+@pytest.mark.asyncio
+async def test_server_timing_breakdown():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    instrument_engine(engine.sync_engine)
+
+    router = APIRouter(route_class=TimedRoute)
+
+    @router.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        with timed("auth"):
+            await asyncio.sleep(0.01)
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return {"id": item_id, "data": ["x"] * 1000}
+
+    app = FastAPI(default_response_class=TimedJSONResponse)
+    app.include_router(router)
+    app.add_middleware(TimingMiddleware, server_timing=True)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/items/1")
+    await engine.dispose()
+
+    metrics = parse_server_timing(response.headers["Server-Timing"])
+    assert {"middleware", "app", "auth", "db", "serialize", "total"} <= set(metrics)
+    assert metrics["auth"] >= 10
+    total = sum(v for k, v in metrics.items() if k != "total")
+    assert metrics["total"] == pytest.approx(total, abs=0.05)
+    assert COMPONENT_SECONDS.labels("/items/{item_id}", "db")._sum.get() > 0
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header_off_by_default():
+    app = FastAPI()
+    app.add_middleware(TimingMiddleware, server_timing=False)
+
+    @app.get("/")
+    def root():
+        return {}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/")
+
+    assert "Server-Timing" not in response.headers
+    assert COMPONENT_SECONDS.labels("/", "middleware")._sum.get() > 0
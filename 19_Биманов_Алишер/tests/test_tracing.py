@@ -0,0 +1,49 @@
+import json
+import httpx
+import pytest
+from fastapi import FastAPI
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from config import tracing
+from config.settings import settings
+
+
+@pytest.mark.asyncio
+async def test_request_and_sql_spans_share_trace(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "TRACING_ENABLED", True)
+    monkeypatch.setattr(settings, "TRACING_SAMPLE_RATIO", 1.0)
+    exporter = InMemorySpanExporter()
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+
+    app = FastAPI()
+
+    @app.get("/users/{user_id}")
+    async def read_user(user_id: int):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return {}
+
+    @app.get("/health")
+    def health():
+        return {}
+
+    provider = tracing.setup_tracing(app, engine, exporter=exporter)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/users/1")
+        await client.get("/health")
+    provider.force_flush()
+    await engine.dispose()
+
+    spans = exporter.get_finished_spans()
+    server = [span for span in spans if span.name == "GET /users/{user_id}"]
+    sql = [span for span in spans if span.attributes.get("db.statement") == "SELECT 1"]
+    assert len(server) == 1 and len(sql) == 1
+    assert sql[0].context.trace_id == server[0].context.trace_id
+    assert not any("/health" in span.name for span in spans)
+
+    file_exporter = tracing._file_exporter(str(tmp_path / "traces.jsonl"))
+    file_exporter.export(spans)
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    assert len(lines) == len(spans)
+    assert all(json.loads(line)["context"]["trace_id"] for line in lines)
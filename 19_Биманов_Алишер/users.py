@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import select
 from metadata import SessionDep
+from config.settings import settings
+from config.rate_limit import rate_limit
+from config.timing import TimedRoute
 from models import User, UserCreate, UserOut, UserLogin, get_current_user, hash_password, verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, timedelta, Token
+from models import ApiKey, ApiKeyCreate, ApiKeyOut, ApiKeyCreated, generate_api_key, hash_api_key, revoke_cached_api_key
 from tests.tasks import send_email_task
 
 router = APIRouter(
+    route_class=TimedRoute,
     prefix="/users",
     tags=["users"]
 )
@@ -64,6 +69,7 @@ router = APIRouter(
         }
     }
 )
+@rate_limit(limit=10, window=60, scope="auth")
 async def register(user: UserCreate, session: SessionDep):
     """Регистрация нового пользователя"""
     db_user = await session.execute(select(User).where(User.username == user.username))
@@ -117,6 +123,7 @@ async def register(user: UserCreate, session: SessionDep):
         }
     }
 )
+@rate_limit(limit=10, window=60, scope="auth")
 async def login(credentials: UserLogin, session: SessionDep):
     user = await session.execute(select(User).where(User.username == credentials.username))
     user = user.scalars().first()
@@ -167,4 +174,104 @@ async def login(credentials: UserLogin, session: SessionDep):
 )
 async def read_users_me(current_user: User = Depends(get_current_user)):
     """Получение информации о текущем пользователе"""
-    return current_user
\ No newline at end of file
+    return current_user
+
+@router.post(
+    "/api-keys",
+    response_model=ApiKeyCreated,
+    status_code=status.HTTP_201_CREATED,
+    summary="Выпуск API-ключа",
+    description="""
+    Выпускает API-ключ для сервисного доступа текущего пользователя.
+
+    Использование:
+    Передавайте ключ в заголовке `X-API-Key: <key>` вместо JWT токена.
+    Проверка ключа не использует bcrypt и кешируется в процессе.
+
+    Ключ возвращается только один раз — в БД хранится лишь его HMAC.
+    """,
+    responses={
+        201: {
+            "description": "Ключ выпущен",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "id": 1,
+                        "name": "nightly-export",
+                        "prefix": "nk_AbCdEfGh",
+                        "created_at": "2025-07-13T23:30:00",
+                        "revoked": False,
+                        "key": "nk_AbCdEfGh..."
+                    }
+                }
+            }
+        },
+        401: {
+            "description": "Пользователь не аутентифицирован",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Not authenticated"}
+                }
+            }
+        }
+    }
+)
+async def create_api_key(data: ApiKeyCreate, session: SessionDep, current_user: User = Depends(get_current_user)):
+    """Выпуск API-ключа"""
+    key = generate_api_key()
+    api_key = ApiKey(
+        name=data.name,
+        prefix=key[:len(settings.API_KEY_PREFIX) + 8],
+        key_hash=hash_api_key(key),
+        owner_id=current_user.id
+    )
+    session.add(api_key)
+    await session.commit()
+    await session.refresh(api_key)
+    return ApiKeyCreated(**api_key.model_dump(), key=key)
+
+@router.get(
+    "/api-keys",
+    response_model=list[ApiKeyOut],
+    summary="Список API-ключей",
+    description="Возвращает API-ключи текущего пользователя без секретов."
+)
+async def list_api_keys(session: SessionDep, current_user: User = Depends(get_current_user)):
+    """Список API-ключей текущего пользователя"""
+    result = await session.execute(select(ApiKey).where(ApiKey.owner_id == current_user.id))
+    return result.scalars().all()
+
+@router.delete(
+    "/api-keys/{key_id}",
+    summary="Отзыв API-ключа",
+    description="Отзывает API-ключ. Ключ перестает работать сразу во всех процессах; если Redis недоступен — не позднее `API_KEY_CACHE_TTL` секунд.",
+    responses={
+        200: {
+            "description": "Ключ отозван",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "API key revoked"}
+                }
+            }
+        },
+        404: {
+            "description": "Ключ не найден",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "API key not found"}
+                }
+            }
+        }
+    }
+)
+async def revoke_api_key(key_id: int, session: SessionDep, current_user: User = Depends(get_current_user)):
+    """Отзыв API-ключа"""
+    result = await session.execute(select(ApiKey).where(ApiKey.id == key_id, ApiKey.owner_id == current_user.id))
+    api_key = result.scalars().first()
+    if not api_key:
+        raise HTTPException(status_code=404, detail="API key not found")
+    api_key.revoked = True
+    session.add(api_key)
+    await session.commit()
+    await revoke_cached_api_key(api_key.key_hash)
+    return {"detail": "API key revoked"}
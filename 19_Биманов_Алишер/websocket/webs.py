@@ -6,6 +6,7 @@ from jose import JWTError, jwt
 from metadata import SECRET_KEY, ALGORITHM
 import urllib.parse
 import logging
+from config.tracing import tracer
 
 router = APIRouter(
     prefix="/ws",
@@ -62,13 +63,16 @@ async def websocket_endpoint(websocket: WebSocket):
         
         while True:
             data = await websocket.receive_text()
-            message = json.loads(data)
-            await manager.broadcast({
-                "type": "message",
-                "username": username,
-                "message": message.get("content"),
-                "timestamp": datetime.now().isoformat()
-            })
+            # Соединение живет долго, поэтому каждое сообщение — отдельная трасса
+            with tracer.start_as_current_span("ws.chat.message", attributes={"enduser.id": username}) as span:
+                message = json.loads(data)
+                await manager.broadcast({
+                    "type": "message",
+                    "username": username,
+                    "message": message.get("content"),
+                    "timestamp": datetime.now().isoformat()
+                })
+                span.set_attribute("ws.recipients", len(manager.active_connections))
             
     except JWTError as e:
         logger.error(f"JWT error: {e}")
@@ -62,6 +62,11 @@ async def run_async_migrations() -> None:
         await connection.run_sync(do_run_migrations)
 
 def run_migrations_online() -> None:
+    # migrate.py передает свое соединение, на котором держит advisory lock
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+        return
     asyncio.run(run_async_migrations())
 
 if context.is_offline_mode():
@@ -1,11 +1,15 @@
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
+from sqlalchemy import event, lambda_stmt
+from sqlalchemy.orm import Session, object_session
 from sqlmodel.ext.asyncio.session import AsyncSession
 from models import User
-from database import async_session
+import time
+from database import get_session
 from config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -26,11 +30,45 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
 
 async def get_user_by_username(session: AsyncSession, username: str):
     from sqlmodel import select
-    statement = select(User).where(User.username == username)
+    # lambda_stmt кеширует построенный запрос, username уходит параметром
+    statement = lambda_stmt(lambda: select(User).where(User.username == username))
     result = await session.execute(statement)
     return result.scalar_one_or_none()
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Неизменяемая копия пользователя для кеша: ORM-объект не делится
+    между запросами."""
+    id: int
+    username: str
+    role: str
+
+# username -> (expires_at, principal). Кеш на процесс: повторные запросы с
+# тем же токеном не ходят в БД за пользователем
+_principal_cache: dict[str, tuple[float, Principal]] = {}
+
+def invalidate_principal(username: str):
+    _principal_cache.pop(username, None)
+
+# Любое изменение пользователя через ORM сбрасывает его из кеша после
+# commit: пониженный или удаленный пользователь сразу теряет права
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _track_principal_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_principals", set()).add(target.username)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_principals(session):
+    for username in session.info.pop("changed_principals", ()):
+        invalidate_principal(username)
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_session)
+):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -44,14 +82,22 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
 
-    async with async_session() as session:
-        user = await get_user_by_username(session, username)
-        if user is None:
-            raise credentials_exception
-        return user
+    now = time.monotonic()
+    cached = _principal_cache.get(username)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    user = await get_user_by_username(session, username)
+    if user is None:
+        raise credentials_exception
+    principal = Principal(id=user.id, username=user.username, role=user.role)
+    if len(_principal_cache) >= settings.PRINCIPAL_CACHE_SIZE:
+        _principal_cache.pop(next(iter(_principal_cache)))
+    _principal_cache[username] = (now + settings.PRINCIPAL_CACHE_TTL, principal)
+    return principal
 
 def require_role(required_role: str):
-    async def role_checker(current_user: User = Depends(get_current_user)):
+    async def role_checker(current_user: Principal = Depends(get_current_user)):
         if current_user.role != required_role:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
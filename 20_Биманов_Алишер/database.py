@@ -1,15 +1,110 @@
+import asyncio
 import os
+import time
+from typing import AsyncGenerator
+from prometheus_client import Gauge, Histogram
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from config import settings
+from sql_profiler import profile_engine
+from migrations import check_schema
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True, future=True)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Время получения соединения из пула БД, включая открытие нового",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_connections_checked_out",
+    "Соединения БД, выданные из пула"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Соединения БД сверх pool_size (max_overflow)"
+)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений с метриками ожидания, занятости и overflow."""
+
+    def _update_gauges(self):
+        DB_POOL_CHECKED_OUT.set(self.checkedout())
+        DB_POOL_OVERFLOW.set(max(self.overflow(), 0))
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+            self._update_gauges()
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self._update_gauges()
+
+
+def create_engine(url: str = None):
+    """Движок БД с настройками пула из settings; для asyncpg задаются
+    размеры кешей подготовленных выражений (0 — для pgbouncer)."""
+    url = make_url(url or settings.DATABASE_URL)
+    connect_args = {}
+    if url.get_driver_name() == "asyncpg":
+        connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+        connect_args["prepared_statement_cache_size"] = settings.DB_PREPARED_STATEMENT_CACHE_SIZE
+
+    engine = create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args
+    )
+    profile_engine(engine.sync_engine)
+    return engine
+
+
+engine = create_engine()
+
+async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 def get_async_session_factory():
-    return sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    return async_session
+
+async def get_session() -> AsyncGenerator[AsyncSession, None]:
+    """Одна сессия на запрос: FastAPI кеширует зависимость, поэтому
+    аутентификация и обработчик получают один и тот же объект. Соединение
+    берется из пула только при первом запросе к БД."""
+    async with async_session() as session:
+        yield session
 
 async def create_db_and_tables():
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+
+async def prepare_database():
+    """Схема на старте: create_all для разработки или проверка ревизии
+    Alembic, когда миграции применяет migrate.py."""
+    if settings.DB_STARTUP_MODE == "check":
+        await check_schema(engine)
+    elif settings.DB_STARTUP_MODE == "create_all":
+        await create_db_and_tables()
+
+async def warm_up_pool():
+    """Открывает DB_POOL_WARMUP соединений при старте, чтобы первые
+    запросы не тратили время на подключение к БД."""
+    size = min(settings.DB_POOL_WARMUP, engine.pool.size())
+    if size <= 0:
+        return
+    connections = await asyncio.gather(*(engine.connect().start() for _ in range(size)))
+    await asyncio.gather(*(connection.close() for connection in connections))
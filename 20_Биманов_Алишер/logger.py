@@ -1,7 +1,41 @@
+import atexit
+import copy
 import logging
+import queue
 import sys
-from pythonjsonlogger import jsonlogger
-from datetime import datetime
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+import orjson
+
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class OrjsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "asctime": datetime.fromtimestamp(record.created, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            "levelname": record.levelname,
+            "name": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Форматирование и запись в stdout выполняет поток QueueListener,
+        # в цикле событий запись только кладется в очередь
+        if record.args:
+            record = copy.copy(record)
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
 
 def setup_logger():
     logger = logging.getLogger()
@@ -9,14 +43,15 @@ def setup_logger():
 
     handler = logging.StreamHandler(sys.stdout)
     handler.setLevel(logging.INFO)
+    handler.setFormatter(OrjsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
 
-    formatter = jsonlogger.JsonFormatter(
-        '%(asctime)s %(levelname)s %(name)s %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    logger.addHandler(DeferredQueueHandler(log_queue))
 
     return logger
 
-logger = setup_logger() 
\ No newline at end of file
+logger = setup_logger()
@@ -2,17 +2,17 @@ from fastapi import FastAPI, HTTPException, status, Depends
 from fastapi.staticfiles import StaticFiles
 from sqlmodel import select, Session
 from models import User, UserCreate, UserLogin, UserRead
-from database import create_db_and_tables, get_async_session_factory, engine
-from auth import get_password_hash, verify_password, create_access_token, get_current_user, require_role, get_user_by_username
+from database import prepare_database, async_session, get_session, engine, warm_up_pool
+from auth import Principal, get_password_hash, verify_password, create_access_token, get_current_user, require_role, get_user_by_username
 from routers import notes
 from routers.tasks import send_mock_email
 from routers import websocket
 from prometheus_fastapi_instrumentator import Instrumentator
 from middleware import LoggingMiddleware, RateLimiterMiddleware
+from sql_profiler import SQLProfilerMiddleware
 from logger import logger
-from redis.asyncio import Redis
+from redis_config import redis_manager
 from config import settings
-from typing import AsyncGenerator
 
 app = FastAPI(
     title="FastAPI Notes API",
@@ -27,9 +27,9 @@ app = FastAPI(
 )
 
 app.add_middleware(LoggingMiddleware)
+app.add_middleware(SQLProfilerMiddleware)
 
-redis = Redis.from_url(settings.REDIS_URL)
-app.add_middleware(RateLimiterMiddleware, redis=redis)
+app.add_middleware(RateLimiterMiddleware, redis_manager=redis_manager)
 
 app.include_router(notes.router)
 app.include_router(websocket.router)
@@ -37,17 +37,11 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 
 Instrumentator().instrument(app).expose(app)
 
-async_session_factory = get_async_session_factory()
-
-async def get_session() -> AsyncGenerator[Session, None]:
-    async with async_session_factory() as session:
-        yield session
-
 async def create_admin():
-    async with async_session_factory() as session:
+    async with async_session() as session:
         statement = select(User).where(User.username == "admin")
         result = await session.exec(statement)
-        admin = result.scalar_one_or_none()
+        admin = result.one_or_none()
         if not admin:
             admin_user = User(
                 username="admin",
@@ -58,12 +52,14 @@ async def create_admin():
             await session.commit()
             logger.info("Admin user created successfully")
 
-app.add_event_handler("startup", create_db_and_tables)
+app.add_event_handler("startup", redis_manager.connect)
+app.add_event_handler("startup", prepare_database)
+app.add_event_handler("startup", warm_up_pool)
 app.add_event_handler("startup", create_admin)
 app.add_event_handler("startup", lambda: logger.info("Application started"))
 
 async def shutdown_event():
-    await redis.aclose()
+    await redis_manager.close()
     logger.info("Application shutdown")
 
 @app.get(
@@ -195,7 +191,7 @@ async def login(user: UserLogin, session: Session = Depends(get_session)):
         }
     }
 )
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     logger.info(f"User profile accessed: {current_user.username}")
     return UserRead(id=current_user.id, username=current_user.username, role=current_user.role)
 
@@ -234,10 +230,10 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
         }
     }
 )
-async def get_all_users(current_user: User = Depends(require_role("admin")), session: Session = Depends(get_session)):
+async def get_all_users(current_user: Principal = Depends(require_role("admin")), session: Session = Depends(get_session)):
     statement = select(User)
     result = await session.exec(statement)
-    users = result.scalars().all()
+    users = result.all()
     logger.info(f"Admin {current_user.username} accessed user list")
     return [UserRead(id=u.id, username=u.username, role=u.role) for u in users]
 
@@ -267,7 +263,7 @@ async def get_all_users(current_user: User = Depends(require_role("admin")), ses
         }
     }
 )
-async def trigger_task(current_user: User = Depends(get_current_user)):
+async def trigger_task(current_user: Principal = Depends(get_current_user)):
     send_mock_email.delay(current_user.username)
     logger.info(f"Task triggered by user: {current_user.username}")
     return {"message": "Task started"}
@@ -1,40 +1,88 @@
+import random
 import time
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from logger import logger
-from redis.asyncio import Redis
+from redis.exceptions import RedisError
 from config import settings
+from rate_limit import RedisRateLimiter
+from redis_config import RedisManager
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        response = await call_next(request)
-        
-        process_time = time.time() - start_time
-        logger.info(f"{request.method} {request.url.path} completed in {process_time:.2f}s")
-        
-        return response 
-
-class RateLimiterMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, redis):
-        super().__init__(app)
-        self.redis = redis
-
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        key = f"rate_limit:{client_ip}"
-        
-        current = await self.redis.get(key)
-        if current is None:
-            await self.redis.set(key, 1, ex=60)
-        elif int(current) >= 100:
+class LoggingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_and_record(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            # Ошибки пишутся всегда, успешные запросы — с долей LOG_SAMPLE_RATE
+            if status_code >= 400 or random.random() < settings.LOG_SAMPLE_RATE:
+                process_time = time.perf_counter() - start_time
+                logger.info(
+                    f"{scope['method']} {scope['path']} {status_code} completed in {process_time:.2f}s",
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status_code": status_code,
+                        "duration_ms": round(process_time * 1000, 3)
+                    }
+                )
+
+class RateLimiterMiddleware:
+    def __init__(self, app: ASGIApp, redis_manager: RedisManager):
+        self.app = app
+        self.redis_manager = redis_manager
+        self.redis = None
+        self.limiter = None
+
+    def get_limiter(self) -> RedisRateLimiter:
+        redis = self.redis_manager.client
+        if redis is not self.redis:
+            self.redis = redis
+            self.limiter = RedisRateLimiter(redis, prefix=settings.RATE_LIMIT_PREFIX)
+        return self.limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        client_ip = scope["client"][0]
+        try:
+            result = await self.get_limiter().hit(client_ip, settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_WINDOW)
+        except RedisError as e:
+            logger.error(f"Redis error in rate limiter: {e}")
+            await self.app(scope, receive, send)
+            return
+
+        if not result.allowed:
             logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return HTTPException(
+            response = JSONResponse(
                 status_code=429,
-                detail="Too many requests. Please try again later."
+                content={"detail": "Too many requests. Please try again later."},
+                headers=result.headers()
             )
-        else:
-            await self.redis.incr(key)
-            
-        return await call_next(request) 
\ No newline at end of file
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(result.headers())
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
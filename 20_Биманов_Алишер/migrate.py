@@ -0,0 +1,34 @@
+"""Применяет миграции Alembic до head под pg_advisory_lock.
+
+Запускается один раз перед стартом приложения (DB_STARTUP_MODE=check):
+
+    python migrate.py [revision]
+
+Пустая БД создается через create_all и отмечается ревизией head. БД,
+которую раньше строил create_all на старте, нужно один раз отметить без
+изменения схемы, после чего обычные запуски применяют новые ревизии:
+
+    python migrate.py --stamp
+"""
+import argparse
+import asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from config import settings
+from migrations import migrate
+import models  # noqa: F401  таблицы для create_all
+
+
+async def main(revision: str, stamp: bool):
+    engine = create_async_engine(settings.DATABASE_URL)
+    try:
+        await migrate(engine, revision, stamp)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("revision", nargs="?", default="head")
+    parser.add_argument("--stamp", action="store_true", help="только отметить ревизию для БД от create_all")
+    args = parser.parse_args()
+    asyncio.run(main(args.revision, args.stamp))
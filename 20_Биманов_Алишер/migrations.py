@@ -0,0 +1,84 @@
+import os
+from functools import lru_cache
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import SQLModel
+from logger import logger
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Ключ pg_advisory_lock: миграции применяет только один процесс
+MIGRATION_LOCK_ID = 720200020
+
+
+class SchemaOutOfDate(RuntimeError):
+    """Ревизия схемы БД не совпадает с head миграций."""
+
+
+def alembic_config() -> Config:
+    return Config(os.path.join(BASE_DIR, "alembic.ini"))
+
+
+@lru_cache
+def head_revisions() -> frozenset[str]:
+    return frozenset(ScriptDirectory.from_config(alembic_config()).get_heads())
+
+
+async def current_revisions(engine: AsyncEngine) -> frozenset[str]:
+    async with engine.connect() as conn:
+        try:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+        except DBAPIError:
+            # Таблицы alembic_version нет — миграции не применялись
+            return frozenset()
+        return frozenset(result.scalars())
+
+
+async def check_schema(engine: AsyncEngine):
+    """Один запрос к alembic_version вместо create_all на старте воркера."""
+    current, heads = await current_revisions(engine), head_revisions()
+    if current != heads:
+        raise SchemaOutOfDate(
+            f"Database revision {sorted(current) or 'none'} != head {sorted(heads)}; run `python migrate.py`"
+        )
+    logger.info(f"Database schema is at {sorted(current)}")
+
+
+def _upgrade(connection, revision: str, stamp: bool = False):
+    config = alembic_config()
+    config.attributes["connection"] = connection
+    if stamp:
+        # Схему уже построил create_all: только записываем ревизию
+        command.stamp(config, revision)
+    elif not inspect(connection).get_table_names():
+        # Пустая БД: ревизии не создают таблицы с нуля, схему строит create_all
+        SQLModel.metadata.create_all(connection)
+        command.stamp(config, revision)
+    else:
+        command.upgrade(config, revision)
+
+
+async def migrate(engine: AsyncEngine, revision: str = "head", stamp: bool = False):
+    """Применяет миграции под advisory lock, чтобы параллельные деплои не
+    запускали их одновременно; второй процесс дождется первого и ничего
+    не изменит. Пустую БД создает create_all с отметкой ревизии, а
+    `stamp` только отмечает ревизию для БД, построенной create_all."""
+    async with engine.connect() as conn:
+        locked = conn.dialect.name == "postgresql"
+        if locked:
+            await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_ID})
+            await conn.commit()
+        try:
+            await conn.run_sync(_upgrade, revision, stamp)
+            await conn.commit()
+        finally:
+            if locked:
+                # После ошибки транзакция прервана: без rollback unlock упал бы
+                # и скрыл исходную ошибку миграции
+                await conn.rollback()
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_ID})
+                await conn.commit()
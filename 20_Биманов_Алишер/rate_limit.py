@@ -0,0 +1,68 @@
+import math
+from dataclasses import dataclass
+from redis.asyncio import Redis
+
+# GCRA (generic cell rate algorithm): в Redis хранится одно число — TAT
+# (theoretical arrival time). Скрипт выполняется атомарно за один round trip,
+# поэтому параллельные запросы не могут проскочить лимит.
+# KEYS[1] - ключ лимита; ARGV: limit, window (сек), cost
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local interval = window / limit
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + interval * cost
+local diff = now - (new_tat - window)
+if diff < 0 then
+    return {0, 0, tostring(tat - now), tostring(-diff)}
+end
+
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.max(1, math.ceil((new_tat - now) * 1000)))
+return {1, math.floor(diff / interval), tostring(new_tat - now), '0'}
+"""
+
+
+@dataclass(slots=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class RedisRateLimiter:
+    def __init__(self, redis: Redis, prefix: str = "ratelimit:"):
+        self.prefix = prefix
+        self.script = redis.register_script(GCRA_SCRIPT)
+
+    async def hit(self, key: str, limit: int, window: int, cost: int = 1) -> RateLimitResult:
+        allowed, remaining, reset_after, retry_after = await self.script(
+            keys=[f"{self.prefix}{key}"], args=[limit, window, cost]
+        )
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=limit,
+            remaining=int(remaining),
+            reset_after=float(reset_after),
+            retry_after=float(retry_after),
+        )
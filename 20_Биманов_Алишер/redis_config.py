@@ -1,15 +1,81 @@
+import asyncio
 import os
+import time
+from typing import Optional
 import redis.asyncio as aioredis
+from prometheus_client import Gauge, Histogram
 from config import settings
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 
+REDIS_POOL_WAIT = Histogram(
+    "redis_pool_wait_seconds",
+    "Время ожидания свободного соединения в пуле Redis",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+REDIS_POOL_IN_USE = Gauge(
+    "redis_pool_connections_in_use",
+    "Соединения Redis, выданные из пула"
+)
+
+
+class InstrumentedConnectionPool(aioredis.BlockingConnectionPool):
+    """BlockingConnectionPool с метриками ожидания и занятости соединений."""
+
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        connection = await super().get_connection(command_name, *keys, **options)
+        REDIS_POOL_WAIT.observe(time.perf_counter() - start)
+        REDIS_POOL_IN_USE.inc()
+        return connection
+
+    async def release(self, connection):
+        await super().release(connection)
+        REDIS_POOL_IN_USE.dec()
+
+
+class RedisManager:
+    """Общий клиент Redis процесса для rate limiter'а и зависимостей."""
+
+    def __init__(self):
+        self.pool: Optional[InstrumentedConnectionPool] = None
+        self._client: Optional[aioredis.Redis] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def connect(self) -> aioredis.Redis:
+        # Пул привязан к циклу событий, в котором создан
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            self.pool = InstrumentedConnectionPool.from_url(
+                settings.REDIS_URL,
+                max_connections=settings.REDIS_POOL_SIZE,
+                timeout=settings.REDIS_POOL_TIMEOUT,
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                socket_keepalive=True,
+                encoding="utf-8",
+                decode_responses=True
+            )
+            self._client = aioredis.Redis(connection_pool=self.pool)
+        return self._client
+
+    @property
+    def client(self) -> aioredis.Redis:
+        return self.connect()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            await self.pool.disconnect()
+            self._client = None
+            self.pool = None
+
+
+redis_manager = RedisManager()
+
+
 async def get_redis() -> aioredis.Redis:
-    redis = await aioredis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
-    try:
-        yield redis
-    finally:
-        await redis.close()
+    return redis_manager.client
 
 CACHE_TTL = 300
-NOTES_CACHE_PREFIX = "notes:" 
\ No newline at end of file
+NOTES_CACHE_PREFIX = "notes:" 
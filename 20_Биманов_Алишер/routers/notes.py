@@ -1,9 +1,9 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Path
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from models import Note, NoteCreate, NoteUpdate, NoteOut, User
-from database import async_session
-from auth import get_current_user
+from models import Note, NoteCreate, NoteUpdate, NoteOut
+from database import get_session
+from auth import Principal, get_current_user
 
 router = APIRouter(
     prefix="/notes",
@@ -43,14 +43,14 @@ router = APIRouter(
 )
 async def create_note(
     note: NoteCreate,
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
 ):
-    async with async_session() as session:
-        new_note = Note(text=note.text, owner_id=current_user.id)
-        session.add(new_note)
-        await session.commit()
-        await session.refresh(new_note)
-        return new_note
+    new_note = Note(text=note.text, owner_id=current_user.id)
+    session.add(new_note)
+    await session.commit()
+    await session.refresh(new_note)
+    return new_note
 
 @router.get(
     "/",
@@ -76,23 +76,23 @@ async def create_note(
     }
 )
 async def read_notes(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
     skip: int = 0,
     limit: int = 100,
     search: str = None,
 ):
-    async with async_session() as session:
-        query = select(Note).where(Note.owner_id == current_user.id)
+    query = select(Note).where(Note.owner_id == current_user.id)
 
-        if search:
-            query = query.where(Note.text.ilike(f"%{search}%"))
+    if search:
+        query = query.where(Note.text.ilike(f"%{search}%"))
 
-        query = query.offset(skip).limit(limit)
+    query = query.offset(skip).limit(limit)
 
-        result = await session.execute(query)
-        notes = result.scalars().all()
+    result = await session.execute(query)
+    notes = result.scalars().all()
 
-        return notes
+    return notes
 
 @router.get(
     "/{note_id}",
@@ -116,13 +116,13 @@ async def read_notes(
 )
 async def read_note(
     note_id: int = Path(..., ge=1, description="ID заметки"),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
 ):
-    async with async_session() as session:
-        note = await session.get(Note, note_id)
-        if not note or note.owner_id != current_user.id:
-            raise HTTPException(status_code=404, detail="Note not found")
-        return note
+    note = await session.get(Note, note_id)
+    if not note or note.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return note
 
 @router.put(
     "/{note_id}",
@@ -147,20 +147,20 @@ async def read_note(
 async def update_note(
     note_id: int = Path(..., ge=1, description="ID заметки"),
     note_update: NoteUpdate = None,
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
 ):
-    async with async_session() as session:
-        note = await session.get(Note, note_id)
-        if not note or note.owner_id != current_user.id:
-            raise HTTPException(status_code=404, detail="Note not found")
+    note = await session.get(Note, note_id)
+    if not note or note.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Note not found")
 
-        if note_update.text is not None:
-            note.text = note_update.text
+    if note_update.text is not None:
+        note.text = note_update.text
 
-        session.add(note)
-        await session.commit()
-        await session.refresh(note)
-        return note
+    session.add(note)
+    await session.commit()
+    await session.refresh(note)
+    return note
 
 @router.delete(
     "/{note_id}",
@@ -183,13 +183,13 @@ async def update_note(
 )
 async def delete_note(
     note_id: int = Path(..., ge=1, description="ID заметки"),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
 ):
-    async with async_session() as session:
-        note = await session.get(Note, note_id)
-        if not note or note.owner_id != current_user.id:
-            raise HTTPException(status_code=404, detail="Note not found")
+    note = await session.get(Note, note_id)
+    if not note or note.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Note not found")
 
-        await session.delete(note)
-        await session.commit()
-        return None
\ No newline at end of file
+    await session.delete(note)
+    await session.commit()
+    return None
\ No newline at end of file
@@ -1,5 +1,6 @@
 from celery import Celery
 import time
+from config import settings
 
 celery_app = Celery(
     "tasks",
@@ -7,6 +8,18 @@ celery_app = Celery(
     backend="redis://redis:6379/0"
 )
 
+# Пул соединений воркера настраивается теми же параметрами, что и у API
+celery_app.conf.update(
+    broker_pool_limit=settings.REDIS_POOL_SIZE,
+    redis_max_connections=settings.REDIS_POOL_SIZE,
+    redis_backend_health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+    redis_socket_keepalive=True,
+    broker_transport_options={
+        "max_connections": settings.REDIS_POOL_SIZE,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+    }
+)
+
 @celery_app.task(
     name="send_mock_email",
     description="Отправляет тестовое email-сообщение указанному пользователю",
@@ -0,0 +1,107 @@
+import time
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+from typing import Optional
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send
+from config import settings
+from logger import logger
+
+DB_QUERIES = Counter(
+    "db_queries_total",
+    "Выполненные SQL-запросы по типу операции",
+    ["operation"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "Время выполнения SQL-запроса",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "Число SQL-запросов на HTTP-запрос",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+DB_N_PLUS_ONE = Counter(
+    "db_n_plus_one_total",
+    "HTTP-запросы, в которых один и тот же SQL выполнялся много раз",
+    ["route"]
+)
+
+class QueryStats:
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: StatementCounter[str] = StatementCounter()
+
+
+_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def redact(parameters):
+    """Вместо значений параметров в лог попадают их типы."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) if isinstance(value, (dict, list, tuple)) else type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def profile_engine(engine: Engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._profiler_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._profiler_start
+        operation = statement.lstrip().split(" ", 1)[0].upper()
+        DB_QUERIES.labels(operation).inc()
+        DB_QUERY_SECONDS.labels(operation).observe(elapsed)
+
+        stats = _stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += elapsed
+            stats.statements[statement] += 1
+
+        if elapsed * 1000 >= settings.SQL_SLOW_QUERY_MS:
+            logger.warning(
+                f"Slow query ({elapsed * 1000:.1f} ms): {statement}",
+                extra={"parameters": redact(parameters), "duration_ms": round(elapsed * 1000, 3)}
+            )
+
+
+class SQLProfilerMiddleware:
+    """Число SQL-запросов и время БД на каждый HTTP-запрос, предупреждение о N+1."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _stats.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _stats.reset(token)
+            route = scope.get("route")
+            label = route.path if route is not None else "unmatched"
+            DB_QUERIES_PER_REQUEST.labels(label).observe(stats.count)
+            repeated = {s: n for s, n in stats.statements.items() if n >= settings.SQL_N_PLUS_ONE_THRESHOLD}
+            if repeated:
+                DB_N_PLUS_ONE.labels(label).inc()
+                logger.warning(
+                    f"Possible N+1 on {label}: {stats.count} queries, {stats.duration * 1000:.1f} ms",
+                    extra={"repeated": repeated}
+                )
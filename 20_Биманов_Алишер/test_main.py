@@ -2,12 +2,13 @@ import pytest
 import pytest_asyncio
 from httpx import AsyncClient
 from httpx import ASGITransport
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import SQLModel
+from sqlmodel import SQLModel, select
 from main import app
 from database import async_session, engine
 from models import User
-from auth import get_password_hash, create_access_token
+from auth import get_password_hash, create_access_token, invalidate_principal
 from asgi_lifespan import LifespanManager
 
 @pytest_asyncio.fixture(scope="module")
@@ -75,3 +76,67 @@ async def test_notes_crud(client):
 
     res_del_fail = await client.delete(f"/notes/{note_id}", headers=headers)
     assert res_del_fail.status_code == 404
+
+@pytest.mark.asyncio
+async def test_one_connection_per_request(client):
+    token = create_access_token({"sub": "testuser"})
+    headers = {"Authorization": f"Bearer {token}"}
+    checkouts = []
+
+    def on_checkout(*args):
+        checkouts.append(args)
+
+    invalidate_principal("testuser")
+    event.listen(engine.sync_engine, "checkout", on_checkout)
+    try:
+        # Аутентификация и обработчик работают в одной сессии
+        assert (await client.get("/notes/", headers=headers)).status_code == 200
+        assert len(checkouts) == 1
+
+        # Пользователь закеширован: запросу без работы с заметками БД не нужна
+        checkouts.clear()
+        assert (await client.get("/users/me", headers=headers)).status_code == 200
+        assert len(checkouts) == 0
+
+        checkouts.clear()
+        assert (await client.get("/notes/", headers=headers)).status_code == 200
+        assert len(checkouts) == 1
+    finally:
+        event.remove(engine.sync_engine, "checkout", on_checkout)
+
+@pytest.mark.asyncio
+async def test_startup_schema_check(tmp_path):
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from migrations import SchemaOutOfDate, check_schema, head_revisions
+
+    schema_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'schema.db'}")
+    (head,) = head_revisions()
+    with pytest.raises(SchemaOutOfDate):
+        await check_schema(schema_engine)
+
+    async with schema_engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        await conn.execute(text("INSERT INTO alembic_version VALUES ('b9685a1efb4d')"))
+    with pytest.raises(SchemaOutOfDate):
+        await check_schema(schema_engine)
+
+    async with schema_engine.begin() as conn:
+        await conn.execute(text("UPDATE alembic_version SET version_num = :head"), {"head": head})
+    await check_schema(schema_engine)
+    await schema_engine.dispose()
+
+@pytest.mark.asyncio
+async def test_role_change_invalidates_cached_principal(client):
+    async with async_session() as session:
+        session.add(User(username="boss", hashed_password=get_password_hash("x"), role="admin"))
+        await session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'boss'})}"}
+    assert (await client.get("/admin/users", headers=headers)).status_code == 200
+
+    async with async_session() as session:
+        boss = (await session.exec(select(User).where(User.username == "boss"))).one()
+        boss.role = "user"
+        session.add(boss)
+        await session.commit()
+    assert (await client.get("/admin/users", headers=headers)).status_code == 403